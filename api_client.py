@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+import requests
+
+import http_client
+from disk_cache import hash_file
+
+# Client for the FastAPI service in upload_api.py
+EXONASCOPE_API_URL = os.getenv("EXONASCOPE_API_URL", "http://localhost:8000")
+
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_RETRIES = 5
+
+JOB_POLL_INITIAL_DELAY = 0.5
+JOB_POLL_MAX_DELAY = 5.0
+
+# Upload key -> remote job id, so a Streamlit rerun polls the existing job instead of resubmitting
+_remote_jobs = {}
+_remote_jobs_lock = threading.Lock()
+
+
+def _server_offset(base_url, upload_id):
+    response = http_client.head("exonascope_api", f"{base_url}/uploads/{upload_id}")
+    response.raise_for_status()
+    return int(response.headers["Upload-Offset"])
+
+
+def resumable_upload(fileobj, filename, size, sha256=None, base_url=EXONASCOPE_API_URL,
+                     chunk_size=UPLOAD_CHUNK_SIZE, on_progress=None):
+    """Upload a seekable file object through the resumable /uploads protocol.
+
+    After a dropped connection the upload resumes from the offset the server
+    reports instead of starting over. Returns the server's completion response.
+    """
+    response = http_client.post("exonascope_api", f"{base_url}/uploads",
+                                json={"filename": filename, "size": size, "sha256": sha256})
+    response.raise_for_status()
+    result = response.json()
+    upload_id, offset = result["upload_id"], result["offset"]
+    failures = 0
+    while not result.get("complete"):
+        fileobj.seek(offset)
+        chunk = fileobj.read(chunk_size)
+        try:
+            # Retried below from the server's offset, not blindly by the client layer
+            response = http_client.patch("exonascope_api", f"{base_url}/uploads/{upload_id}", data=chunk,
+                                         headers={"Upload-Offset": str(offset),
+                                                  "Content-Type": "application/offset+octet-stream"})
+        except (requests.ConnectionError, requests.Timeout):
+            failures += 1
+            if failures > UPLOAD_RETRIES:
+                raise
+            time.sleep(min(2**failures, 30))
+            offset = _server_offset(base_url, upload_id)
+            continue
+        if response.status_code == 409:
+            offset = int(response.headers["Upload-Offset"])
+            continue
+        response.raise_for_status()
+        result = response.json()
+        offset = result["offset"]
+        failures = 0
+        if on_progress:
+            on_progress(offset, size)
+    return result
+
+
+# --- Background extraction jobs ---
+
+def submit_extraction_job(sha256, filename, mime_type=None, pdf_mode="hybrid", base_url=EXONASCOPE_API_URL):
+    response = http_client.post("exonascope_api", f"{base_url}/jobs",
+                                json={"sha256": sha256, "filename": filename, "mime_type": mime_type,
+                                      "pdf_mode": pdf_mode})
+    response.raise_for_status()
+    return response.json()["job_id"]
+
+
+def get_extraction_job(job_id, base_url=EXONASCOPE_API_URL):
+    response = http_client.get("exonascope_api", f"{base_url}/jobs/{job_id}")
+    response.raise_for_status()
+    return response.json()
+
+
+def cancel_extraction_job(job_id, base_url=EXONASCOPE_API_URL):
+    http_client.delete("exonascope_api", f"{base_url}/jobs/{job_id}")
+
+
+def cancel_remote_extraction(key, base_url=EXONASCOPE_API_URL):
+    """Cancel the remote job started for an upload key; no-op for unknown keys."""
+    with _remote_jobs_lock:
+        job_id = _remote_jobs.pop(key, None)
+    if job_id:
+        try:
+            cancel_extraction_job(job_id, base_url)
+        except requests.RequestException:
+            pass
+
+
+def wait_for_extraction_job(job_id, progress=None, base_url=EXONASCOPE_API_URL):
+    delay = JOB_POLL_INITIAL_DELAY
+    while True:
+        job = get_extraction_job(job_id, base_url)
+        if job["status"] == "completed":
+            return job["result"]
+        if job["status"] == "failed":
+            return f"[Extraction job failed: {job['error']}]"
+        if job["status"] == "cancelled":
+            return "[Extraction job cancelled]"
+        if progress:
+            progress(job["progress"])
+        time.sleep(delay)
+        delay = min(delay * 1.5, JOB_POLL_MAX_DELAY)
+
+
+def extract_text_remotely(file, name, mime_type, pdf_mode="hybrid", key=None, progress=None,
+                          base_url=EXONASCOPE_API_URL, content_hash=None):
+    """Upload a file (skipped if the server already has it), run extraction as a job and wait for the text."""
+    with _remote_jobs_lock:
+        job_id = _remote_jobs.get(key) if key else None
+    if job_id is None:
+        sha256 = content_hash or hash_file(file)
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        if progress:
+            progress("Uploading to job server...")
+        resumable_upload(file, name, size, sha256=sha256, base_url=base_url)
+        job_id = submit_extraction_job(sha256, name, mime_type, pdf_mode, base_url)
+        if key:
+            with _remote_jobs_lock:
+                _remote_jobs[key] = job_id
+    result = wait_for_extraction_job(job_id, progress, base_url)
+    if key:
+        with _remote_jobs_lock:
+            _remote_jobs.pop(key, None)
+    return result
@@ -0,0 +1,349 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+import http_client
+from audio_tools import detect_silences, extract_asr_audio, plan_segments, probe_duration
+from telemetry import bind, span
+
+ASSEMBLYAI_BASE_URL = os.getenv("ASSEMBLYAI_BASE_URL", "https://api.assemblyai.com/v2")
+
+# Webhook delivery via upload_api.py; when unset we fall back to polling only
+WEBHOOK_URL = os.getenv("ASSEMBLYAI_WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("ASSEMBLYAI_WEBHOOK_SECRET")
+WEBHOOK_AUTH_HEADER = "X-Webhook-Secret"
+UPLOAD_API_URL = os.getenv("EXONASCOPE_API_URL")
+LONG_POLL_SECONDS = 10
+
+# Adaptive polling: fast first checks for short clips, backing off for long recordings
+POLL_INITIAL_DELAY = 1.0
+POLL_BACKOFF = 1.5
+POLL_MAX_DELAY = 15.0
+
+# Deadline = base allowance + a multiple of the media duration
+TIMEOUT_BASE_SECONDS = 300
+TIMEOUT_PER_MEDIA_SECOND = 1.0
+TIMEOUT_UNKNOWN_DURATION = 1800
+
+# Recordings longer than this are split at silences and transcribed in parallel
+LONG_AUDIO_SECONDS = float(os.getenv("LONG_AUDIO_SPLIT_MINUTES", "30")) * 60
+SEGMENT_MAX_SECONDS = 600
+SEGMENT_CONCURRENCY = 6
+
+# Fixed buffer size for streaming media to disk and to the upload endpoint
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_chunks(fileobj, chunk_size=STREAM_CHUNK_SIZE):
+    while chunk := fileobj.read(chunk_size):
+        yield chunk
+
+
+def copy_in_chunks(src, dst, chunk_size=STREAM_CHUNK_SIZE):
+    for chunk in iter_chunks(src, chunk_size):
+        dst.write(chunk)
+
+
+def upload_stream(fileobj, api_key):
+    """Send a binary stream to /upload as a chunked body; returns (upload_url, error)."""
+    headers = {"authorization": api_key, "content-type": "application/octet-stream"}
+    with span("assemblyai.upload", bytes=0) as s:
+
+        def counted_chunks():
+            for chunk in iter_chunks(fileobj):
+                s.add("bytes", len(chunk))
+                yield chunk
+
+        response = http_client.post("assemblyai", f"{ASSEMBLYAI_BASE_URL}/upload", headers=headers,
+                                    data=counted_chunks())
+        s.set(status=response.status_code)
+    if response.status_code != 200:
+        return None, f"[Upload Error: {response.text}]"
+    return response.json()["upload_url"], None
+
+
+def upload_file(filepath, api_key):
+    with open(filepath, "rb") as f:
+        return upload_stream(f, api_key)
+
+
+def transcription_timeout(duration_seconds):
+    if not duration_seconds:
+        return TIMEOUT_UNKNOWN_DURATION
+    return TIMEOUT_BASE_SECONDS + TIMEOUT_PER_MEDIA_SECOND * duration_seconds
+
+
+# --- Job registry (lets a later Streamlit run resume or cancel a transcription) ---
+
+TRANSCRIPTION_CANCELLED = "[Transcription cancelled]"
+
+
+class TranscriptionJob:
+
+    def __init__(self, key, cancelled=None):
+        self.key = key
+        self.transcript_id = None
+        self.cancelled = cancelled or threading.Event()
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def get_job(key, parent=None):
+    """Return the job registered under `key`, creating it if needed; a child shares its parent's cancel event."""
+    with _jobs_lock:
+        if key not in _jobs:
+            _jobs[key] = TranscriptionJob(key, parent.cancelled if parent is not None else None)
+        return _jobs[key]
+
+
+def release_job(key):
+    with _jobs_lock:
+        _jobs.pop(key, None)
+
+
+def cancel_job(key, api_key):
+    """Stop waiting on a job (and its segment jobs) and ask AssemblyAI to drop them; no-op for unknown keys."""
+    with _jobs_lock:
+        keys = [k for k in _jobs if k == key or k.startswith(f"{key}#")]
+        jobs = [_jobs.pop(k) for k in keys]
+    for job in jobs:
+        job.cancelled.set()
+        if job.transcript_id:
+            delete_transcript(job.transcript_id, api_key)
+
+
+def delete_transcript(transcript_id, api_key):
+    """Ask AssemblyAI to drop a transcript; best effort."""
+    try:
+        http_client.delete("assemblyai", f"{ASSEMBLYAI_BASE_URL}/transcript/{transcript_id}",
+                           headers={"authorization": api_key}, retries=0)
+    except requests.RequestException:
+        pass
+
+
+# --- Transcription ---
+
+def start_transcription(upload_url, api_key):
+    """Submit a transcript job; returns (transcript_id, error)."""
+    headers = {"authorization": api_key}
+    payload = {"audio_url": upload_url}
+    if WEBHOOK_URL:
+        payload["webhook_url"] = WEBHOOK_URL
+        if WEBHOOK_SECRET:
+            payload["webhook_auth_header_name"] = WEBHOOK_AUTH_HEADER
+            payload["webhook_auth_header_value"] = WEBHOOK_SECRET
+    with span("assemblyai.submit"):
+        response = http_client.post("assemblyai", f"{ASSEMBLYAI_BASE_URL}/transcript", headers=headers, json=payload)
+    if response.status_code != 200:
+        return None, f"[Start Error: {response.text}]"
+    return response.json()["id"], None
+
+
+def _wait_for_webhook(transcript_id, wait_seconds):
+    """Long-poll upload_api.py for the completion webhook; True once it has arrived."""
+    try:
+        response = http_client.get("exonascope_api", f"{UPLOAD_API_URL}/assemblyai/transcripts/{transcript_id}/wait",
+                                   params={"timeout": wait_seconds}, timeout=wait_seconds + 5, retries=0)
+        return response.status_code == 200 and response.json().get("status") in ("completed", "error")
+    except requests.RequestException:
+        time.sleep(wait_seconds)
+        return False
+
+
+def wait_for_transcript_data(transcript_id, api_key, timeout, job=None, on_poll=None):
+    """Wait for a transcript, woken by the webhook when available and otherwise polling with backoff.
+
+    Returns (transcript_json, error).
+    """
+    with span("assemblyai.queue", polls=0) as s:
+        data, error = _wait_for_transcript_data(transcript_id, api_key, timeout, job, on_poll, s)
+        s.set(status=data["status"] if data else error)
+    return data, error
+
+
+def _wait_for_transcript_data(transcript_id, api_key, timeout, job, on_poll, queue_span):
+    headers = {"authorization": api_key}
+    started = time.monotonic()
+    delay = POLL_INITIAL_DELAY
+    while True:
+        poll_response = http_client.get("assemblyai", f"{ASSEMBLYAI_BASE_URL}/transcript/{transcript_id}", headers=headers)
+        data = poll_response.json()
+        queue_span.add("polls")
+        status = data["status"]
+        if status == "completed":
+            return data, None
+        elif status == "error":
+            return None, f"[Transcription Error: {data['error']}]"
+        elapsed = time.monotonic() - started
+        if on_poll:
+            on_poll(status, elapsed)
+        remaining = timeout - elapsed
+        if remaining <= 0:
+            return None, "[Timeout waiting for transcription]"
+        if WEBHOOK_URL and UPLOAD_API_URL:
+            _wait_for_webhook(transcript_id, min(LONG_POLL_SECONDS, remaining))
+        elif job is not None:
+            job.cancelled.wait(min(delay, remaining))
+        else:
+            time.sleep(min(delay, remaining))
+        if job is not None and job.cancelled.is_set():
+            return None, TRANSCRIPTION_CANCELLED
+        delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+
+
+def transcribe_file_data(filepath, api_key, job=None, on_poll=None, duration=None):
+    """Upload and transcribe a file, returning (transcript_json, error).
+
+    A job that already has a transcript id is resumed without re-uploading. A
+    cancelled job uploads nothing, and a transcript submitted just as its job was
+    cancelled is deleted again.
+    """
+    if job is None or not job.transcript_id:
+        if job is not None and job.cancelled.is_set():
+            return None, TRANSCRIPTION_CANCELLED
+        upload_url, error = upload_file(filepath, api_key)
+        if error:
+            return None, error
+        if job is not None and job.cancelled.is_set():
+            return None, TRANSCRIPTION_CANCELLED
+        transcript_id, error = start_transcription(upload_url, api_key)
+        if error:
+            return None, error
+        if job is not None:
+            job.transcript_id = transcript_id
+            # cancel_job may have run before transcript_id was set, when it had nothing to delete
+            if job.cancelled.is_set():
+                delete_transcript(transcript_id, api_key)
+                return None, TRANSCRIPTION_CANCELLED
+    else:
+        transcript_id = job.transcript_id
+    if duration is None:
+        duration = probe_duration(filepath)
+    result = wait_for_transcript_data(transcript_id, api_key, transcription_timeout(duration), job, on_poll)
+    if job is not None:
+        release_job(job.key)
+    return result
+
+
+def transcribe(filepath, api_key, job=None, on_poll=None, split_long=True):
+    """Transcribe a file, splitting recordings longer than LONG_AUDIO_SECONDS at silences.
+
+    Returns (transcript, error); the transcript has "text" and "words", with word
+    timestamps (ms) on the original file's timeline either way.
+    """
+    duration = probe_duration(filepath)
+    if split_long and duration and duration > LONG_AUDIO_SECONDS:
+        return transcribe_long_file(filepath, api_key, duration, job, on_poll)
+    return transcribe_file_data(filepath, api_key, job, on_poll, duration)
+
+
+def transcribe_file(filepath, api_key, job=None, on_poll=None, split_long=True):
+    data, error = transcribe(filepath, api_key, job, on_poll, split_long)
+    return error or data["text"]
+
+
+# --- Long recordings: split at silences, transcribe segments concurrently, stitch ---
+
+def stitch_segments(segments, transcripts):
+    """Join segment transcripts, shifting word timestamps (ms) onto the original timeline.
+
+    Each word is kept only by the segment whose seam range contains its midpoint,
+    so words in the overlap around a hard cut are not duplicated. Returns
+    (text, words); words is empty if any segment came back without them.
+    """
+    if any(not data.get("words") for data in transcripts):
+        return " ".join(_trim_overlap(segment, data.get("text") or "")
+                        for segment, data in zip(segments, transcripts)).strip(), []
+    words = []
+    last = len(segments) - 1
+    for i, (segment, data) in enumerate(zip(segments, transcripts)):
+        offset_ms = segment["start"] * 1000
+        seam_start_ms, seam_end_ms = segment["seam_start"] * 1000, segment["seam_end"] * 1000
+        for word in data["words"]:
+            start, end = word["start"] + offset_ms, word["end"] + offset_ms
+            midpoint = (start + end) / 2
+            if seam_start_ms <= midpoint and (midpoint < seam_end_ms or i == last):
+                words.append({**word, "start": int(start), "end": int(end)})
+    return " ".join(word["text"] for word in words), words
+
+
+def _trim_overlap(segment, text):
+    """Without word timestamps, drop the share of a segment's words spoken outside its seam range.
+
+    Assumes an even speaking rate across the segment; segments cut at silences
+    have no overlap and are left whole.
+    """
+    words = text.split()
+    length = segment["end"] - segment["start"]
+    if not words or length <= 0:
+        return " ".join(words)
+    head = round(len(words) * (segment["seam_start"] - segment["start"]) / length)
+    tail = round(len(words) * (segment["end"] - segment["seam_end"]) / length)
+    return " ".join(words[head:len(words) - tail])
+
+
+def transcribe_long_file(filepath, api_key, duration, job=None, on_poll=None):
+    """Transcribe a long recording in segments; returns (transcript, error) like transcribe_file_data."""
+    with span("assemblyai.long_file", duration=duration) as s:
+        return _transcribe_long_file(filepath, api_key, duration, job, on_poll, s)
+
+
+def _transcribe_long_file(filepath, api_key, duration, job, on_poll, long_span):
+    segments = plan_segments(duration, detect_silences(filepath), SEGMENT_MAX_SECONDS)
+    long_span.set(segments=len(segments))
+    segment_paths = []
+    started = time.monotonic()
+    try:
+        for segment in segments:
+            if job is not None and job.cancelled.is_set():
+                return None, TRANSCRIPTION_CANCELLED
+            path = extract_asr_audio(filepath, start=segment["start"], duration=segment["end"] - segment["start"])
+            if path.startswith("[Audio extraction failed"):
+                return None, path
+            segment_paths.append(path)
+
+        def transcribe_segment(i):
+            duration = segments[i]["end"] - segments[i]["start"]
+            if job is None:
+                return transcribe_file_data(segment_paths[i], api_key, duration=duration)
+            if job.cancelled.is_set():
+                return None, TRANSCRIPTION_CANCELLED
+            # Queued segments register only now, after cancel_job may have swept the
+            # parent's children, so they share its cancel event rather than a fresh one
+            child = get_job(f"{job.key}#seg{i}", parent=job)
+            try:
+                return transcribe_file_data(segment_paths[i], api_key, child, duration=duration)
+            finally:
+                release_job(child.key)
+
+        transcripts = [None] * len(segments)
+        errors = []
+        done = 0
+        with ThreadPoolExecutor(max_workers=min(SEGMENT_CONCURRENCY, len(segments))) as pool:
+            futures = {pool.submit(bind(transcribe_segment), i): i for i in range(len(segments))}
+            for future in as_completed(futures):
+                data, error = future.result()
+                if error:
+                    errors.append(error)
+                else:
+                    transcripts[futures[future]] = data
+                done += 1
+                if on_poll:
+                    on_poll(f"{done} of {len(segments)} segments finished", time.monotonic() - started)
+        if job is not None and job.cancelled.is_set():
+            return None, TRANSCRIPTION_CANCELLED
+        if errors:
+            return None, errors[0]
+        text, words = stitch_segments(segments, transcripts)
+        return {"text": text, "words": words}, None
+    finally:
+        for path in segment_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        if job is not None:
+            release_job(job.key)
@@ -0,0 +1,108 @@
+import os
+import re
+import subprocess
+import tempfile
+
+from telemetry import span
+
+# Mono 16 kHz low-bitrate MP3: what the ASR needs, at a fraction of PCM WAV size
+ASR_SAMPLE_RATE = 16000
+ASR_CHANNELS = 1
+ASR_BITRATE = "32k"
+ASR_FORMAT = "mp3"
+ASR_CODEC = "libmp3lame"
+
+# Silence detection for splitting long recordings
+SILENCE_NOISE_DB = -35
+SILENCE_MIN_SECONDS = 0.4
+# Extra audio on each side of a cut that had to fall mid-speech
+HARD_CUT_OVERLAP_SECONDS = 1.0
+
+
+def has_audio_track(video_path):
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "a", "-show_entries", "stream=index", "-of", "csv=p=0", video_path]
+    with span("ffprobe.audio_track"):
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return result.stdout.strip() != b''
+
+
+def asr_audio_command(input_path, output="pipe:1", start=None, duration=None):
+    """Single ffmpeg invocation: demux, decode and encode straight to ASR-ready audio."""
+    seek = ["-ss", f"{start:.3f}"] if start else []
+    limit = ["-t", f"{duration:.3f}"] if duration else []
+    return [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        *seek, "-i", input_path, *limit,
+        "-vn", "-sn", "-dn", "-map", "0:a:0",
+        "-ac", str(ASR_CHANNELS), "-ar", str(ASR_SAMPLE_RATE),
+        "-c:a", ASR_CODEC, "-b:a", ASR_BITRATE,
+        "-f", ASR_FORMAT, output
+    ]
+
+
+def extract_asr_audio(input_path, output_path=None, start=None, duration=None):
+    """Write ASR-ready audio (optionally just [start, start + duration)) to one file.
+
+    Returns its path or a "[...]" error string.
+    """
+    if output_path is None:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{ASR_FORMAT}") as temp_audio:
+            output_path = temp_audio.name
+    try:
+        with span("ffmpeg.reencode", bytes=os.path.getsize(input_path)) as s:
+            subprocess.run(asr_audio_command(input_path, output_path, start, duration), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            s.set(output_bytes=os.path.getsize(output_path))
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return f"[Audio extraction failed: {e.stderr.decode(errors='replace')}]"
+    return output_path
+
+
+def probe_duration(media_path):
+    """Media duration in seconds from ffprobe, or None if it cannot be determined."""
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", media_path]
+    with span("ffprobe.duration"):
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def detect_silences(media_path, noise_db=SILENCE_NOISE_DB, min_silence=SILENCE_MIN_SECONDS):
+    """Return [(start, end), ...] silent intervals in seconds using ffmpeg's silencedetect."""
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner", "-i", media_path, "-vn",
+           "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"]
+    with span("ffmpeg.silencedetect"):
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    log = result.stderr.decode(errors="replace")
+    starts = [float(v) for v in re.findall(r"silence_start: (-?[\d.]+)", log)]
+    ends = [float(v) for v in re.findall(r"silence_end: ([\d.]+)", log)]
+    return list(zip(starts, ends))
+
+
+def plan_segments(duration, silences, max_seconds, overlap=HARD_CUT_OVERLAP_SECONDS):
+    """Plan cuts of at most `max_seconds`, placed in the latest silence when possible.
+
+    Each segment is a dict with the audio range to extract (`start`, `end`) and the
+    seam range (`seam_start`, `seam_end`) it owns when transcripts are stitched back
+    together. Cuts that had to land mid-speech get `overlap` seconds of extra audio
+    on both sides so no word is lost at the seam.
+    """
+    cuts, hard = [0.0], [False]
+    pos = 0.0
+    while duration - pos > max_seconds:
+        target = pos + max_seconds
+        midpoints = [(s + e) / 2 for s, e in silences if pos + max_seconds / 2 <= (s + e) / 2 <= target]
+        cuts.append(max(midpoints) if midpoints else target)
+        hard.append(not midpoints)
+        pos = cuts[-1]
+    cuts.append(duration)
+    hard.append(False)
+    return [{
+        "start": max(cuts[i] - (overlap if hard[i] else 0), 0.0),
+        "end": min(cuts[i + 1] + (overlap if hard[i + 1] else 0), duration),
+        "seam_start": cuts[i],
+        "seam_end": cuts[i + 1],
+    } for i in range(len(cuts) - 1)]
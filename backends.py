@@ -0,0 +1,79 @@
+"""Lazy loading of the heavy per-file-type backends, plus an import-time report.
+
+PyMuPDF, python-docx, tesseract/pdf2image/PIL, fpdf, openai and tiktoken are
+imported on first use via `backend(name)` rather than at module top, so a cold
+process that only handles DOCX files never pays for the OCR or PDF stacks.
+
+    python -m backends            # cold import time of each backend and app module
+"""
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from telemetry import span
+
+# Third-party backends the app loads lazily, in rough order of import cost
+BACKENDS = ("openai", "fitz", "tiktoken", "fpdf", "docx", "pdf2image", "pytesseract", "PIL.Image", "httpx",
+            "requests")
+# App modules a page imports at startup; each should stay cheap to import
+APP_MODULES = ("extraction", "fact_extraction", "llm_client", "legal_analysis", "case_memo", "assemblyai_client",
+               "api_client", "http_client", "telemetry")
+
+_load_times = {}
+_lock = threading.Lock()
+
+
+def backend(module_name):
+    """Import `module_name` on first call (timed, and recorded as a span); later calls are a dict lookup."""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    with _lock:
+        module = sys.modules.get(module_name)
+        if module is None:
+            with span("backend.import", module=module_name):
+                started = time.perf_counter()
+                module = importlib.import_module(module_name)
+                _load_times[module_name] = time.perf_counter() - started
+    return module
+
+
+def loaded_backends():
+    """{module: seconds} for backends loaded through `backend()` in this process (0.0 if already imported)."""
+    with _lock:
+        times = dict(_load_times)
+    for name in BACKENDS:
+        if name in sys.modules and name not in times:
+            times[name] = 0.0
+    return times
+
+
+def cold_import_time(module_name, cwd=None):
+    """Seconds to import `module_name` in a fresh interpreter, or None if the import fails."""
+    code = ("import time; started = time.perf_counter(); import importlib; "
+            f"importlib.import_module({module_name!r}); print(time.perf_counter() - started)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=cwd or os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip())
+
+
+def import_report(modules=APP_MODULES + BACKENDS):
+    return {name: cold_import_time(name) for name in modules}
+
+
+def main():
+    report = import_report()
+    width = max(map(len, report))
+    for name, seconds in report.items():
+        shown = "import failed" if seconds is None else f"{seconds * 1000:8.1f} ms"
+        print(f"{name:<{width}}  {shown}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Headless batch runner: Phase 1–3 over a directory of case folders, no Streamlit.
+
+Each subdirectory of INPUT_DIR is one case. Every supported file in it (PDF, DOCX,
+audio, video) is extracted; an optional case.json supplies
+{"case_name", "case_number", "defendant"}. One memo per case is written to
+OUTPUT_DIR as <case>.docx.
+
+    python batch_cli.py cases/ memos/ --parallel 4 --jurisdictions scotus ca9 california
+"""
+import argparse
+import json
+import logging
+import mimetypes
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+
+from case_memo import JURIS_LIST, build_memo, build_memo_sections, memo_docx
+from extraction import extract_text, file_kind
+from fact_extraction import extract_facts_chunked
+from legal_analysis import generate_defenses, generate_suppression_issues, summarize_facts_for_motion
+
+log = logging.getLogger("exonascope.batch")
+
+NO_TAGS = "[No tagged legal events provided]"
+MEMO_TITLE = "CASE ANALYSIS MEMORANDUM"
+
+
+def load_case_info(case_dir):
+    info = {"case_name": os.path.basename(os.path.normpath(case_dir)), "case_number": "", "defendant": ""}
+    info_path = os.path.join(case_dir, "case.json")
+    if os.path.exists(info_path):
+        with open(info_path) as f:
+            info.update(json.load(f))
+    return info
+
+
+def extract_case_segments(case_dir, pdf_mode):
+    segments = []
+    for name in sorted(os.listdir(case_dir)):
+        path = os.path.join(case_dir, name)
+        if not os.path.isfile(path) or file_kind(name, mimetypes.guess_type(name)[0] or "") is None:
+            continue
+        with open(path, "rb") as f:
+            parsed = extract_text(f, name, None, os.getenv("ASSEMBLYAI_API_KEY"), pdf_mode=pdf_mode,
+                                  job_key=path, progress=lambda msg, n=name: log.debug("%s: %s", n, msg))
+        if parsed.startswith("["):
+            log.warning("%s: %s", path, parsed[:200])
+        elif parsed.strip():
+            segments.append(f"[{name}]\n{parsed}")
+    return segments
+
+
+def run_case(case_dir, output_dir, juris_codes, appellate_only, pdf_mode):
+    """Run one case end to end and return the memo path."""
+    info = load_case_info(case_dir)
+    segments = extract_case_segments(case_dir, pdf_mode)
+    if not segments:
+        raise RuntimeError("nothing extractable")
+
+    facts, failed_chunks = extract_facts_chunked(segments, info["case_name"], info["case_number"],
+                                                 os.getenv("OPENAI_API_KEY"))
+    if facts.startswith("["):
+        raise RuntimeError(facts)
+    if failed_chunks:
+        # A memo built on partial facts could miss the very event an issue turns on
+        raise RuntimeError(f"fact extraction failed for chunk(s) {', '.join(map(str, failed_chunks))}")
+
+    issues = generate_suppression_issues(facts, NO_TAGS)
+    defenses = generate_defenses(facts, NO_TAGS)
+    memo_facts = summarize_facts_for_motion(facts, NO_TAGS)
+
+    juris_label = ", ".join(desc for desc, code in JURIS_LIST if code in juris_codes)
+    jobs = ([({"title": i["title"], "argument": i["explanation"]}, True) for i in issues] +
+            [({"title": d["title"], "argument": d["explanation"]}, False) for d in defenses])
+    sections = build_memo_sections(jobs, memo_facts, juris_codes, juris_label, appellate_only)
+    suppression_sections, defense_sections = sections[:len(issues)], sections[len(issues):]
+
+    memo = build_memo(MEMO_TITLE, info["defendant"], info["case_number"], date.today().strftime("%B %d, %Y"),
+                      memo_facts, suppression_sections, defense_sections)
+    memo_path = os.path.join(output_dir, f"{os.path.basename(os.path.normpath(case_dir))}.docx")
+    memo_docx(memo).save(memo_path)
+    return memo_path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run ExonaScope Phase 1–3 over a directory of cases.")
+    parser.add_argument("input_dir", help="directory containing one subdirectory per case")
+    parser.add_argument("output_dir", help="directory to write memos to")
+    parser.add_argument("--parallel", type=int, default=2, help="cases processed at once (default 2)")
+    parser.add_argument("--jurisdictions", nargs="+", default=["scotus"], metavar="CODE",
+                        help="CourtListener jurisdiction codes (default: scotus)")
+    parser.add_argument("--all-courts", action="store_true", help="include trial courts in caselaw search")
+    parser.add_argument("--pdf-mode", choices=["hybrid", "text", "ocr"], default="hybrid")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    os.makedirs(args.output_dir, exist_ok=True)
+    case_dirs = sorted(
+        os.path.join(args.input_dir, name) for name in os.listdir(args.input_dir)
+        if os.path.isdir(os.path.join(args.input_dir, name)))
+    if not case_dirs:
+        log.error("No case directories found in %s", args.input_dir)
+        return 1
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+        futures = {
+            pool.submit(run_case, case_dir, args.output_dir, args.jurisdictions, not args.all_courts,
+                        args.pdf_mode): case_dir
+            for case_dir in case_dirs
+        }
+        for future in as_completed(futures):
+            case_dir = futures[future]
+            try:
+                log.info("%s -> %s", case_dir, future.result())
+            except Exception as e:
+                failed += 1
+                log.error("%s failed: %s", case_dir, e)
+    log.info("%d of %d cases completed", len(case_dirs) - failed, len(case_dirs))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
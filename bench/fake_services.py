@@ -0,0 +1,336 @@
+"""Local stand-ins for AssemblyAI, OpenAI and CourtListener used by the benchmarks.
+
+Each server answers the subset of the real API the app calls, with configurable
+per-request latency and injected failures, so pipeline timings can be measured
+offline and repeatably.
+"""
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+LOREM = ("officer approached the vehicle at approximately nine in the evening and asked the driver to step out "
+         "while a second unit searched the trunk without a warrant or consent").split()
+
+
+class FaultConfig:
+    """Latency and error injection shared by every fake server.
+
+    `latency` seconds (plus up to `jitter`) is added to each request; `error_rate`
+    is the fraction answered with `error_status` instead.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, retry_after=0.1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        time.sleep(self.latency + extra)
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None  # set per server subclass
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(parts)
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_method(self, method):
+        service = self.service
+        body = self.read_body() if method in ("POST", "PATCH", "PUT") else b""
+        service.faults.delay()
+        service.count(method, urlparse(self.path).path)
+        if service.faults.should_fail():
+            service.errors += 1
+            self.send_json({"error": {"message": "injected failure"}}, service.faults.error_status,
+                           {"Retry-After": str(service.faults.retry_after)})
+            return
+        service.route(self, method, body)
+
+    def do_GET(self):
+        self.handle_method("GET")
+
+    def do_POST(self):
+        self.handle_method("POST")
+
+    def do_DELETE(self):
+        self.handle_method("DELETE")
+
+
+class FakeService:
+    """Base class: runs a ThreadingHTTPServer on a free localhost port in a daemon thread."""
+
+    def __init__(self, faults=None):
+        self.faults = faults or FaultConfig()
+        self.requests = {}
+        self.errors = 0
+        self._count_lock = threading.Lock()
+        handler = type(f"{type(self).__name__}Handler", (FakeHandler, ), {"service": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, method, path):
+        key = f"{method} {re.sub(r'/[0-9a-f-]{16,}', '/{id}', path)}"
+        with self._count_lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def route(self, handler, method, body):
+        handler.send_json({"error": "not found"}, 404)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeAssemblyAI(FakeService):
+    """/v2/upload, /v2/transcript and /v2/transcript/{id}.
+
+    A transcript completes `processing_ratio` × audio seconds after submission (the
+    audio length is estimated from the uploaded bytes at `bytes_per_second`).
+    """
+
+    def __init__(self, faults=None, processing_ratio=0.05, min_processing=0.5, bytes_per_second=4000):
+        super().__init__(faults)
+        self.processing_ratio = processing_ratio
+        self.min_processing = min_processing
+        self.bytes_per_second = bytes_per_second
+        self.uploads = {}
+        self.transcripts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"{self.url}/v2"
+
+    def route(self, handler, method, body):
+        path = urlparse(handler.path).path
+        if method == "POST" and path == "/v2/upload":
+            upload_id = uuid.uuid4().hex
+            with self._lock:
+                self.uploads[upload_id] = len(body)
+            handler.send_json({"upload_url": f"{self.url}/files/{upload_id}"})
+        elif method == "POST" and path == "/v2/transcript":
+            request = json.loads(body or b"{}")
+            upload_id = request.get("audio_url", "").rsplit("/", 1)[-1]
+            with self._lock:
+                seconds = self.uploads.get(upload_id, 0) / self.bytes_per_second
+                transcript_id = uuid.uuid4().hex
+                self.transcripts[transcript_id] = {
+                    "ready_at": time.monotonic() + max(self.min_processing, seconds * self.processing_ratio),
+                    "seconds": seconds
+                }
+            handler.send_json({"id": transcript_id, "status": "queued"})
+        elif path.startswith("/v2/transcript/"):
+            transcript_id = path.rsplit("/", 1)[-1]
+            with self._lock:
+                transcript = self.transcripts.get(transcript_id)
+                if method == "DELETE":
+                    self.transcripts.pop(transcript_id, None)
+            if transcript is None:
+                handler.send_json({"error": "Transcript not found"}, 404)
+            elif method == "DELETE":
+                handler.send_json({"id": transcript_id, "status": "error", "error": "deleted"})
+            elif time.monotonic() < transcript["ready_at"]:
+                handler.send_json({"id": transcript_id, "status": "processing"})
+            else:
+                words = fake_words(transcript["seconds"])
+                handler.send_json({
+                    "id": transcript_id,
+                    "status": "completed",
+                    "text": " ".join(w["text"] for w in words),
+                    "words": words,
+                    "audio_duration": transcript["seconds"]
+                })
+        else:
+            super().route(handler, method, body)
+
+
+def fake_words(seconds, words_per_second=2.5):
+    words = []
+    for i, text in zip(range(int(seconds * words_per_second)), itertools.cycle(LOREM)):
+        start = int(i * 1000 / words_per_second)
+        words.append({"text": text, "start": start, "end": start + 300, "confidence": 0.95})
+    return words
+
+
+class FakeOpenAI(FakeService):
+    """/v1/chat/completions, plain and streamed (SSE).
+
+    Output length is `completion_tokens` words, emitted at `tokens_per_second` when
+    streaming. Prompts asking for a JSON list get a JSON list of issues back.
+    """
+
+    def __init__(self, faults=None, completion_tokens=300, tokens_per_second=0.0):
+        super().__init__(faults)
+        self.completion_tokens = completion_tokens
+        self.tokens_per_second = tokens_per_second
+        self.prompt_chars = 0
+
+    @property
+    def base_url(self):
+        return f"{self.url}/v1"
+
+    def completion_text(self, messages):
+        prompt = messages[-1]["content"] if messages else ""
+        if "JSON list" in prompt:
+            return json.dumps([{"title": f"Issue {i + 1}", "explanation": " ".join(LOREM[:12])} for i in range(3)])
+        words = [LOREM[i % len(LOREM)] for i in range(self.completion_tokens)]
+        half = len(words) // 2
+        return (" ".join(words[:half]) + "\n\nCounterarguments and Rebuttal: " + " ".join(words[half:]))
+
+    def route(self, handler, method, body):
+        if not (method == "POST" and urlparse(handler.path).path == "/v1/chat/completions"):
+            return super().route(handler, method, body)
+        request = json.loads(body or b"{}")
+        messages = request.get("messages", [])
+        self.prompt_chars += sum(len(m.get("content") or "") for m in messages)
+        text = self.completion_text(messages)
+        completion_id = "chatcmpl-" + hashlib.sha1(text.encode()).hexdigest()[:24]
+        base = {"id": completion_id, "created": int(time.time()), "model": request.get("model", "gpt-4o")}
+        if not request.get("stream"):
+            if self.tokens_per_second:
+                time.sleep(len(text.split()) / self.tokens_per_second)
+            handler.send_json({
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": self.prompt_chars // 4, "completion_tokens": len(text.split()),
+                          "total_tokens": self.prompt_chars // 4 + len(text.split())}
+            })
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send_event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            handler.wfile.flush()
+
+        for token in re.findall(r"\S+\s*", text):
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            send_event(json.dumps({**base, "object": "chat.completion.chunk",
+                                   "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}))
+        send_event(json.dumps({**base, "object": "chat.completion.chunk",
+                               "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        send_event("[DONE]")
+        handler.wfile.write(b"0\r\n\r\n")
+
+
+class FakeCourtListener(FakeService):
+    """/api/rest/v3/search/ returning deterministic opinions, newest first, one page at a time.
+
+    Each jurisdiction has a per-query number of opinions (0 to `max_per_court - 1`)
+    spread over its court ids, so grouped searches come back paginated and
+    uneven the way the real API does. `court_ids` maps a jurisdiction code to
+    its court ids (pass courtlistener_client.JURISDICTION_COURTS); codes not in
+    it get made-up state-style ids that differ from the code.
+    """
+
+    def __init__(self, faults=None, court_ids=None, max_per_court=30):
+        super().__init__(faults)
+        self.court_ids = court_ids or {}
+        self.max_per_court = max_per_court
+
+    @property
+    def base_url(self):
+        return f"{self.url}/api/rest/v3"
+
+    def courts_for(self, code):
+        if code in self.court_ids:
+            return list(self.court_ids[code])
+        if re.match(r"^(scotus|ca\d+|cadc|cafc)$", code):
+            return [code]
+        abbr = code.replace("_", "")[:6]
+        return [abbr, f"{abbr}ctapp"]
+
+    def route(self, handler, method, body):
+        parsed = urlparse(handler.path)
+        if not (method == "GET" and parsed.path == "/api/rest/v3/search/"):
+            return super().route(handler, method, body)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        matches = []
+        for code in params.get("jurisdiction", params.get("court", "scotus")).split():
+            courts = self.courts_for(code)
+            seed = int(hashlib.sha1(f"{params.get('q', '')}|{code}".encode()).hexdigest()[:8], 16)
+            for i in range(seed % self.max_per_court):
+                n = seed + i
+                court = courts[n % len(courts)]
+                matches.append({
+                    "caseName": f"State v. Doe {n % 9973}",
+                    "citation": f"{n % 900 + 1} F.3d {n % 1500 + 1}",
+                    "court": {"name": court, "id": court},
+                    "court_id": court,
+                    "dateFiled": f"{1990 + n % 34}-{n % 12 + 1:02d}-{n % 28 + 1:02d}",
+                    "absolute_url": f"/opinion/{n}/state-v-doe/",
+                    "plain_text": " ".join(LOREM * 3),
+                })
+        matches.sort(key=lambda item: (item["dateFiled"], item["absolute_url"]), reverse=True)
+        page_size = int(params.get("page_size", 20))
+        page = int(params.get("page", 1))
+        results = matches[(page - 1) * page_size:page * page_size]
+        next_url = None
+        if page * page_size < len(matches):
+            query = {**params, "page": page + 1}
+            next_url = f"{self.base_url}/search/?" + "&".join(f"{k}={quote(str(v))}" for k, v in query.items())
+        handler.send_json({"count": len(matches), "next": next_url, "previous": None, "results": results})
@@ -0,0 +1,91 @@
+"""Synthetic inputs for the benchmarks: text PDFs, scanned PDFs, DOCX files and audio.
+
+Everything is generated on demand into a scratch directory, so no binary
+fixtures live in the repo and sizes can be scaled from the command line.
+"""
+import os
+import subprocess
+
+from bench.fake_services import LOREM
+
+
+def fixture_paragraphs(count, words=120):
+    return [" ".join(LOREM[(i + j) % len(LOREM)] for j in range(words)).capitalize() + "." for i in range(count)]
+
+
+def make_text_pdf(path, pages=20):
+    import fitz
+
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        text = f"Incident report page {number + 1}\n\n" + "\n\n".join(fixture_paragraphs(4))
+        page.insert_textbox(fitz.Rect(54, 54, page.rect.width - 54, page.rect.height - 54), text, fontsize=10)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_scanned_pdf(path, pages=5, dpi=150):
+    """Image-only pages, so text extraction finds nothing and every page goes through OCR."""
+    from PIL import Image, ImageDraw
+
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    images = []
+    for number in range(pages):
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        y = dpi // 2
+        lines = [f"Scanned statement page {number + 1}"] + fixture_paragraphs(12, words=10)
+        for line in lines:
+            draw.text((dpi // 2, y), line, fill=0)
+            y += dpi // 4
+        images.append(image.convert("RGB"))
+    images[0].save(path, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    return path
+
+
+def make_docx(path, paragraphs=60):
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading("Witness Statement", level=1)
+    for text in fixture_paragraphs(paragraphs):
+        doc.add_paragraph(text)
+    doc.save(path)
+    return path
+
+
+def make_audio(path, seconds=120):
+    """A tone with periodic silences (so long-audio splitting finds cut points)."""
+    expression = "if(lt(mod(t,8),7),0.3*sin(2*PI*440*t),0)"
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i",
+                    f"aevalsrc={expression}:s=16000:d={seconds}", "-ac", "1", "-b:a", "32k", path], check=True)
+    return path
+
+
+def make_video(path, seconds=60):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"testsrc=size=320x240:rate=10:d={seconds}",
+                    "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=16000:d={seconds}", "-shortest",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", path], check=True)
+    return path
+
+
+def build_fixtures(directory, pdf_pages=20, scan_pages=5, docx_paragraphs=60, audio_seconds=120,
+                   video_seconds=60):
+    """Create one fixture of each kind in `directory`; returns {name: path}."""
+    os.makedirs(directory, exist_ok=True)
+    builders = {
+        "report.pdf": lambda p: make_text_pdf(p, pdf_pages),
+        "scan.pdf": lambda p: make_scanned_pdf(p, scan_pages),
+        "statement.docx": lambda p: make_docx(p, docx_paragraphs),
+        "interview.mp3": lambda p: make_audio(p, audio_seconds),
+        "bodycam.mp4": lambda p: make_video(p, video_seconds),
+    }
+    fixtures = {}
+    for name, build in builders.items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            build(path)
+        fixtures[name] = path
+    return fixtures
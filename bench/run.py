@@ -0,0 +1,174 @@
+"""Offline pipeline benchmark.
+
+Starts the fake AssemblyAI, OpenAI and CourtListener servers, points the app at
+them through its base-URL settings, builds synthetic fixtures and times:
+
+  extract      extract_text per fixture (what Phase 1's extract_text_from_file runs)
+  facts        extract_facts_chunked over all extracted segments (Phase 1's
+               extract_facts_with_gpt_chunked)
+  memo         Phase 3 memo generation: build_memo_sections over the issues and
+               defenses, streamed and at the page's concurrency
+
+    python -m bench.run --latency 0.05 --error-rate 0.02 --repeat 3 --json bench.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+
+from bench.fake_services import FakeAssemblyAI, FakeCourtListener, FakeOpenAI, FaultConfig
+from bench.fixtures import build_fixtures
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.samples = {}
+        self.failures = {}
+
+    def run(self, stage, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            if isinstance(result, tuple):  # (facts, failed_chunks)
+                failed = result[0].startswith("[") or bool(result[1])
+            else:
+                failed = isinstance(result, str) and result.startswith("[")
+        except Exception as e:
+            result, failed = e, True
+        self.samples.setdefault(stage, []).append(time.perf_counter() - started)
+        if failed:
+            self.failures[stage] = self.failures.get(stage, 0) + 1
+        return result
+
+    def summary(self):
+        rows = []
+        for stage, samples in self.samples.items():
+            rows.append({
+                "stage": stage,
+                "runs": len(samples),
+                "failures": self.failures.get(stage, 0),
+                "min": min(samples),
+                "median": statistics.median(samples),
+                "mean": statistics.fmean(samples),
+                "max": max(samples),
+                "total": sum(samples),
+            })
+        return rows
+
+
+def point_app_at(assemblyai, openai_server, courtlistener, cache_dir, use_llm_cache, use_search_cache=False,
+                 use_section_cache=False):
+    """Must run before the pipeline modules are imported, since they read these at import time."""
+    os.environ.update({
+        "ASSEMBLYAI_BASE_URL": assemblyai.base_url,
+        "ASSEMBLYAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": openai_server.base_url,
+        "OPENAI_API_KEY": "bench",
+        "COURTLISTENER_API_URL": courtlistener.base_url,
+        "EXONASCOPE_CACHE_DIR": cache_dir,
+        "LLM_CACHE_DISABLED": "" if use_llm_cache else "1",
+        "COURTLISTENER_CACHE_DISABLED": "" if use_search_cache else "1",
+        "MEMO_SECTION_CACHE_DISABLED": "" if use_section_cache else "1",
+    })
+    os.environ.pop("ASSEMBLYAI_WEBHOOK_URL", None)
+
+
+def run_benchmark(args, timer, work_dir):
+    from case_memo import JURIS_LIST, build_memo_sections
+    from extraction import extract_text
+    from fact_extraction import extract_facts_chunked
+
+    fixtures = build_fixtures(os.path.join(work_dir, "fixtures"), pdf_pages=args.pdf_pages,
+                              scan_pages=args.scan_pages, audio_seconds=args.audio_seconds,
+                              video_seconds=args.video_seconds)
+    segments = []
+    for _ in range(args.repeat):
+        segments = []
+        for name, path in fixtures.items():
+            with open(path, "rb") as f:
+                parsed = timer.run(f"extract:{name}", extract_text, f, name, None, os.environ["ASSEMBLYAI_API_KEY"],
+                                   use_cache=args.extraction_cache)
+            if isinstance(parsed, str) and not parsed.startswith("["):
+                segments.append(f"[{name}]\n{parsed}")
+
+    for _ in range(args.repeat):
+        facts = timer.run("facts", extract_facts_chunked, segments, "State v. Bench", "BENCH-001",
+                          os.environ["OPENAI_API_KEY"])
+    facts = facts[0] if isinstance(facts, tuple) else ""
+
+    juris_label = ", ".join(desc for desc, code in JURIS_LIST if code in args.jurisdictions)
+    jobs = [({"title": f"Issue {i + 1}", "argument": "Warrantless search of the trunk without consent."}, i % 2 == 0)
+            for i in range(args.sections)]
+    for _ in range(args.repeat):
+        # Same call as the Phase 3 page: default concurrency, drafts streamed to a callback
+        timer.run("memo", build_memo_sections, jobs, facts, args.jurisdictions, juris_label, True,
+                  on_text=lambda idx, text: None, on_section=lambda idx, section: None)
+
+
+def print_report(rows, services):
+    print(f"{'stage':<28}{'runs':>6}{'fail':>6}{'min':>9}{'median':>9}{'mean':>9}{'max':>9}")
+    for row in rows:
+        print(f"{row['stage']:<28}{row['runs']:>6}{row['failures']:>6}"
+              f"{row['min']:>9.3f}{row['median']:>9.3f}{row['mean']:>9.3f}{row['max']:>9.3f}")
+    print()
+    for name, service in services.items():
+        calls = ", ".join(f"{k}={v}" for k, v in sorted(service.requests.items()))
+        print(f"{name}: {calls or 'no requests'} (injected errors: {service.errors})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ExonaScope against local fake services.")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every fake request")
+    parser.add_argument("--jitter", type=float, default=0.02, help="random extra latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="fake OpenAI generation speed (0 = instant)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pdf-pages", type=int, default=20)
+    parser.add_argument("--scan-pages", type=int, default=5)
+    parser.add_argument("--audio-seconds", type=int, default=120)
+    parser.add_argument("--video-seconds", type=int, default=60)
+    parser.add_argument("--sections", type=int, default=6, help="issues + defenses in the memo loop")
+    parser.add_argument("--jurisdictions", nargs="+", default=["scotus", "ca9", "california"])
+    parser.add_argument("--llm-cache", action="store_true", help="leave the LLM response cache on")
+    parser.add_argument("--extraction-cache", action="store_true", help="leave the extraction cache on")
+    parser.add_argument("--search-cache", action="store_true", help="leave the CourtListener search cache on")
+    parser.add_argument("--section-cache", action="store_true", help="leave the memo section cache on")
+    parser.add_argument("--work-dir", help="keep fixtures and caches here instead of a temp dir")
+    parser.add_argument("--json", help="also write results to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    faults = FaultConfig(args.latency, args.jitter, args.error_rate, args.error_status)
+    with ExitStack() as stack:
+        work_dir = args.work_dir or stack.enter_context(tempfile.TemporaryDirectory(prefix="exonascope-bench-"))
+        services = {
+            "assemblyai": stack.enter_context(FakeAssemblyAI(faults)),
+            "openai": stack.enter_context(FakeOpenAI(faults, tokens_per_second=args.tokens_per_second)),
+            "courtlistener": stack.enter_context(FakeCourtListener(faults)),
+        }
+        point_app_at(services["assemblyai"], services["openai"], services["courtlistener"],
+                     os.path.join(work_dir, "cache"), args.llm_cache, args.search_cache, args.section_cache)
+        from courtlistener_client import JURISDICTION_COURTS
+        services["courtlistener"].court_ids = JURISDICTION_COURTS
+        timer = StageTimer()
+        run_benchmark(args, timer, work_dir)
+        rows = timer.summary()
+        print_report(rows, services)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"args": vars(args), "stages": rows,
+                           "requests": {name: s.requests for name, s in services.items()}}, f, indent=2)
+    return 1 if any(row["failures"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
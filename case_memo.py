@@ -0,0 +1,569 @@
+import functools
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO
+from backends import backend
+from courtlistener_client import search_caselaw
+from disk_cache import CACHE_DIR, DiskCache
+from llm_client import DEFAULT_MODEL, chat_completion, make_client, stream_chat_completion
+from telemetry import bind, span
+import hashlib
+import re  # For cleaning memo sections
+
+# Case analysis memo building blocks shared by the Phase 3 page and the batch CLI.
+# Nothing here imports Streamlit.
+
+# Memo sections searched and drafted at once
+MEMO_SECTION_CONCURRENCY = int(os.getenv("MEMO_SECTION_CONCURRENCY", "4"))
+
+# Finished sections, keyed by everything that goes into them, so reordering boxes,
+# undoing an edit or reopening a case rebuilds nothing
+SECTION_CACHE_ENABLED = os.getenv("MEMO_SECTION_CACHE_DISABLED", "") not in ("1", "true", "yes")
+SECTION_CACHE_TTL_SECONDS = int(os.getenv("MEMO_SECTION_CACHE_TTL_HOURS", "720")) * 3600
+SECTION_CACHE_MAX_BYTES = int(os.getenv("MEMO_SECTION_CACHE_MAX_MB", "64")) * 1024 * 1024
+SECTION_CACHE_VERSION = 1
+_section_cache = None
+_section_cache_lock = threading.Lock()
+
+# ---- Jurisdictions ----
+JURIS_LIST = [
+    # ...[as before, full list of states/territories/federal appellate circuits]...
+    ("Alabama", "alabama"),
+    ("Alaska", "alaska"),
+    ("Arizona", "arizona"),
+    ("Arkansas", "arkansas"),
+    ("California", "california"),
+    ("Colorado", "colorado"),
+    ("Connecticut", "connecticut"),
+    ("Delaware", "delaware"),
+    ("District of Columbia", "dc"),
+    ("Florida", "florida"),
+    ("Georgia", "georgia"),
+    ("Hawaii", "hawaii"),
+    ("Idaho", "idaho"),
+    ("Illinois", "illinois"),
+    ("Indiana", "indiana"),
+    ("Iowa", "iowa"),
+    ("Kansas", "kansas"),
+    ("Kentucky", "kentucky"),
+    ("Louisiana", "louisiana"),
+    ("Maine", "maine"),
+    ("Maryland", "maryland"),
+    ("Massachusetts", "massachusetts"),
+    ("Michigan", "michigan"),
+    ("Minnesota", "minnesota"),
+    ("Mississippi", "mississippi"),
+    ("Missouri", "missouri"),
+    ("Montana", "montana"),
+    ("Nebraska", "nebraska"),
+    ("Nevada", "nevada"),
+    ("New Hampshire", "new_hampshire"),
+    ("New Jersey", "new_jersey"),
+    ("New Mexico", "new_mexico"),
+    ("New York", "new_york"),
+    ("North Carolina", "north_carolina"),
+    ("North Dakota", "north_dakota"),
+    ("Ohio", "ohio"),
+    ("Oklahoma", "oklahoma"),
+    ("Oregon", "oregon"),
+    ("Pennsylvania", "pennsylvania"),
+    ("Puerto Rico", "pr"),
+    ("Rhode Island", "rhode_island"),
+    ("South Carolina", "south_carolina"),
+    ("South Dakota", "south_dakota"),
+    ("Tennessee", "tennessee"),
+    ("Texas", "texas"),
+    ("Utah", "utah"),
+    ("Vermont", "vermont"),
+    ("Virginia", "virginia"),
+    ("Washington", "washington"),
+    ("West Virginia", "west_virginia"),
+    ("Wisconsin", "wisconsin"),
+    ("Wyoming", "wyoming"),
+    ("American Samoa", "as"),
+    ("Guam", "gu"),
+    ("Northern Mariana Islands", "mp"),
+    ("Virgin Islands", "vi"),
+    ("Supreme Court of the United States", "scotus"),
+    ("1st Cir. Court of Appeals", "ca1"),
+    ("2nd Cir. Court of Appeals", "ca2"),
+    ("3rd Cir. Court of Appeals", "ca3"),
+    ("4th Cir. Court of Appeals", "ca4"),
+    ("5th Cir. Court of Appeals", "ca5"),
+    ("6th Cir. Court of Appeals", "ca6"),
+    ("7th Cir. Court of Appeals", "ca7"),
+    ("8th Cir. Court of Appeals", "ca8"),
+    ("9th Cir. Court of Appeals", "ca9"),
+    ("10th Cir. Court of Appeals", "ca10"),
+    ("11th Cir. Court of Appeals", "ca11"),
+    ("D.C. Circuit", "cadc"),
+    ("Federal Circuit", "cafc"),
+]
+
+
+def bluebook_citation(case):
+    if not case.get("case_name") or not case.get("citation"): return ""
+    citation = f"*{case['case_name']}*, {case['citation']} ({case['court']} {case['date'][:4]})"
+    if case.get("url"): return f"[{citation}]({case['url']})"
+    return citation
+
+
+def bluebook_citation_docx(case):
+    if not case.get("case_name") or not case.get("citation"): return ""
+    return f"{case['case_name']}, {case['citation']} ({case['court']} {case['date'][:4]})"
+
+
+def clean_unicode(text):
+    """Replace problematic Unicode characters with ASCII equivalents for PDF export."""
+    replacements = {
+        '\u2013': '-',  # en-dash
+        '\u2014': '--',  # em-dash
+        '\u2018': "'",  # left single quote
+        '\u2019': "'",  # right single quote (your current error)
+        '\u201c': '"',  # left double quote
+        '\u201d': '"',  # right double quote
+        # Add further replacements here if needed
+    }
+    for uni_char, ascii_char in replacements.items():
+        text = text.replace(uni_char, ascii_char)
+    return text
+
+
+def gpt_argument_and_rebuttal(section_title,
+                              arg,
+                              facts,
+                              jurisdiction_str,
+                              caselaw_md,
+                              is_suppression=True,
+                              on_text=None):
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    what = 'suppression issue' if is_suppression else 'defense theory'
+    prompt = f"""You are an experienced criminal defense attorney. For a confidential internal memorandum, draft a clear, highly professional legal argument for:
+    {what.title()}: {section_title}
+    Jurisdictions: {jurisdiction_str}
+    Facts: {facts}
+    Argument/Explanation: {arg}
+    Supporting Caselaw:
+    {caselaw_md}
+
+    Cite using Bluebook format (name, citation, year), and then write a short 'Counterarguments and Rebuttal' section that anticipates and responds to how the prosecution will likely attack this argument. Use real cited cases in both main argument and the rebuttal if possible. Label each section clearly. 
+    Write the section as if it is part of a professional legal memorandum being submitted to court.
+    Do NOT include boilerplate headers such as 'To:', 'From:', 'Date:', or 'Subject:'.
+    Use the section title (e.g., 'Unlawful Arrest Without Probable Cause') as a bold or styled heading.
+    Begin directly with the legal argument and reasoning.
+    """
+    # Call the API, or replay the cached response to an identical prompt, and return the text.
+    # With on_text, the text so far is passed to it as the response streams in.
+    client = make_client(api_key)
+    messages = [{
+        "role":
+        "system",
+        "content":
+        "You are a skilled criminal defense legal memo writer."
+    }, {
+        "role": "user",
+        "content": prompt
+    }]
+    if on_text is None:
+        return chat_completion(client, messages, use_cache=True)
+    text = ""
+    for delta in stream_chat_completion(client, messages, use_cache=True):
+        text += delta
+        on_text(text)
+    return text
+
+
+def clean_memo_section(text):
+    # Remove any remaining boilerplate lines if GPT still returns them
+    patterns_to_remove = [
+        r"(?i)^To:.*$",
+        r"(?i)^From:.*$",
+        r"(?i)^Date:.*$",
+        r"(?i)^Subject:.*$",
+        r"(?i)^Argument:.*$",  # Remove "Argument: XYZ" headers
+    ]
+    for pattern in patterns_to_remove:
+        text = re.sub(pattern, "", text, flags=re.MULTILINE)
+    return text.strip()
+
+
+# ---- Memo model ----
+# One memo model (header fields plus a flat list of (kind, value) blocks) feeds
+# the HTML preview, the DOCX and the PDF, each rendered in memory
+
+PRIVILEGE_NOTICE = "ATTORNEY–CLIENT PRIVILEGED / WORK PRODUCT"
+MEMO_CONCLUSION = ("This memorandum is for internal defense team review only and is not intended for filing "
+                   "without attorney revision.")
+NO_CASELAW_HTML = "<i>No relevant caselaw found for this argument in the selected jurisdictions.</i>"
+
+
+def section_blocks(number, section):
+    blocks = [("item", f"{number}. {section['title']}"), ("paragraph", section["argument"]),
+              ("label", "Supporting Caselaw:")]
+    if section["cases"]:
+        blocks.extend(("case", case) for case in section["cases"])
+    else:
+        blocks.append(("no_cases", None))
+    if section.get("rebuttal"):
+        blocks.extend([("label", "Counterarguments and Rebuttal:"), ("paragraph", section["rebuttal"])])
+    return blocks
+
+
+def build_memo(title, defendant, case_num, date_str, facts, suppression_sections, defense_sections):
+    """The memo model for a case: header fields plus the body as (kind, value) blocks."""
+    blocks = [("heading", "SUMMARY OF PERTINENT FACTS"), ("paragraph", facts), ("heading", "A. SUPPRESSION ISSUES")]
+    for idx, s in enumerate(suppression_sections, 1):
+        blocks.extend(section_blocks(idx, s))
+    blocks.append(("heading", "B. POTENTIAL DEFENSES"))
+    for idx, d in enumerate(defense_sections, 1):
+        blocks.extend(section_blocks(idx, d))
+    blocks.extend([("heading", "CONCLUSION"), ("text", MEMO_CONCLUSION)])
+    return {
+        "title": title,
+        "defendant": defendant,
+        "case_number": case_num,
+        "date": date_str,
+        "blocks": blocks
+    }
+
+
+def case_line(case, citation=bluebook_citation):
+    line = citation(case)
+    if case.get('summary'):
+        line += f" — {case['summary']}"
+    return line
+
+
+def blocks_html(blocks):
+    lines = []
+    for kind, value in blocks:
+        if kind in ("heading", "item", "label"):
+            if kind == "heading" and lines:
+                lines.append("")
+            lines.append(f"<b>{value}</b>")
+        elif kind == "case":
+            lines.append(f"&nbsp;&nbsp;• {case_line(value)}")
+        elif kind == "no_cases":
+            lines.append(f"&nbsp;&nbsp;{NO_CASELAW_HTML}")
+        else:
+            lines.append(value)
+    return "<br>".join(lines)
+
+
+def section_html(number, section):
+    return blocks_html(section_blocks(number, section))
+
+
+def memo_html(memo):
+    """Markdown-compatible HTML for st.markdown(..., unsafe_allow_html=True)."""
+    return "<br>".join([
+        f"<div style='text-align: center; font-weight: bold; font-size:20px;'>{memo['title']}</div>",
+        f"<b>Defendant:</b> {memo['defendant']} &nbsp;&nbsp;&nbsp; <b>Case Number:</b> {memo['case_number']} "
+        f"&nbsp;&nbsp;&nbsp; <b>Date:</b> {memo['date']}<br>",
+        f"<b>{PRIVILEGE_NOTICE}</b><br>",
+        blocks_html(memo["blocks"]),
+    ])
+
+
+def memo_docx(memo):
+    # python-docx is loaded on first export, not when the page starts
+    backend("docx")
+    from docx import Document
+    from docx.enum.text import WD_LINE_SPACING, WD_PARAGRAPH_ALIGNMENT
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    from docx.shared import Pt, RGBColor
+
+    doc = Document()
+    section = doc.sections[0]
+    section.left_margin = section.right_margin = Pt(72)
+    section.top_margin = section.bottom_margin = Pt(72)
+
+    # === Add Header ===
+    header = section.header
+    header_para = header.paragraphs[0]
+    header_para.text = f"{memo['title']}    Case #: {memo['case_number']}    Date: {memo['date']}"
+    header_para.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
+    run = header_para.runs[0]
+    run.font.size = Pt(11)
+    run.font.name = "Century Schoolbook"
+    run.bold = True
+
+    # === Add Footer with Page Number + Disclaimer ===
+    footer = section.footer
+    para = footer.paragraphs[0]
+    para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    run = para.add_run("Page ")
+    fldChar1 = OxmlElement('w:fldChar')
+    fldChar1.set(qn('w:fldCharType'), 'begin')
+    instrText = OxmlElement('w:instrText')
+    instrText.text = "PAGE"
+    fldChar2 = OxmlElement('w:fldChar')
+    fldChar2.set(qn('w:fldCharType'), 'end')
+    run._r.append(fldChar1)
+    run._r.append(instrText)
+    run._r.append(fldChar2)
+    run.font.name = "Century Schoolbook"
+    run.font.size = Pt(9)
+
+    disclaimer = footer.add_paragraph()
+    disclaimer.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    disc_run = disclaimer.add_run(
+        f"This memorandum is for internal defense team review only.\n{PRIVILEGE_NOTICE}")
+    disc_run.font.color.rgb = RGBColor(128, 128, 128)
+    disc_run.italic = True
+    disc_run.font.name = "Century Schoolbook"
+    disc_run.font.size = Pt(9)
+
+    # === Main Title ===
+    p = doc.add_paragraph(memo["title"])
+    p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    p.runs[0].font.size = Pt(16)
+    p.runs[0].font.name = "Century Schoolbook"
+    p.runs[0].bold = True
+    p.paragraph_format.space_after = Pt(24)
+
+    # === Body Sections ===
+    def add_body_heading(text):
+        para = doc.add_paragraph(text)
+        para.runs[0].bold = True
+        para.paragraph_format.space_after = Pt(12)
+
+    def add_justified(text):
+        para = doc.add_paragraph(text)
+        para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+        para.paragraph_format.first_line_indent = Pt(24)
+        para.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
+        para.paragraph_format.space_after = Pt(12)
+
+    for kind, value in memo["blocks"]:
+        if kind == "heading":
+            add_body_heading(value)
+        elif kind == "paragraph":
+            add_justified(value)
+        elif kind in ("item", "label"):
+            doc.add_paragraph(value).runs[0].bold = True
+        elif kind == "case":
+            doc.add_paragraph(case_line(value, bluebook_citation_docx), style='List Bullet')
+        elif kind == "no_cases":
+            doc.add_paragraph("No relevant caselaw found.", style='List Bullet')
+        else:
+            doc.add_paragraph(value)
+
+    # Final font styling
+    for p in doc.paragraphs:
+        for r in p.runs:
+            r.font.name = "Century Schoolbook"
+            r.font.size = Pt(12)
+    return doc
+
+
+def memo_docx_bytes(memo):
+    buffer = BytesIO()
+    memo_docx(memo).save(buffer)
+    return buffer.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def case_memo_pdf_class():
+    """The memo's FPDF subclass, built on first use so fpdf is only imported for PDF export."""
+    FPDF = backend("fpdf").FPDF
+
+    class CaseMemoPDF(FPDF):
+
+        def __init__(self, case_title, case_number, memo_date):
+            super().__init__()
+            self.case_title = case_title
+            self.case_number = case_number
+            self.memo_date = memo_date
+            self.set_auto_page_break(auto=True, margin=20)
+            self.alias_nb_pages()
+
+        def header(self):
+            self.set_font("Arial", "B", 11)
+            self.set_text_color(0)
+            self.cell(
+                0,
+                8,
+                f"{self.case_title}    Case #: {self.case_number}    Date: {self.memo_date}",
+                ln=1,
+                align="L")
+            self.ln(2)
+
+        def footer(self):
+            self.set_y(-20)
+            self.set_font("Arial", "", 9)
+            self.set_text_color(0)
+            self.cell(0, 6, f"Page {self.page_no()} of {{nb}}", align="C", ln=1)
+            self.set_text_color(128)
+            self.set_font("Arial", "I", 8)
+            self.multi_cell(
+                0,
+                4,
+                "This memorandum is for internal defense team review only.\nATTORNEY–CLIENT PRIVILEGED / WORK PRODUCT",
+                align="C")
+
+    return CaseMemoPDF
+
+
+def memo_pdf_bytes(memo):
+    """The memo as PDF bytes, laid out to match the DOCX."""
+    pdf = case_memo_pdf_class()(memo["title"], memo["case_number"], memo["date"])
+    pdf.add_page()
+    pdf.set_left_margin(20)
+    pdf.set_right_margin(20)
+
+    for kind, value in [("heading", memo["title"])] + memo["blocks"]:
+        if kind == "case":
+            text = "- " + case_line(value, bluebook_citation_docx)
+        elif kind == "no_cases":
+            text = "- No relevant caselaw found."
+        else:
+            text = value
+        text = clean_unicode(text.strip())
+        pdf.set_text_color(0)  # the footer leaves it grey after a page break
+
+        if not text:
+            pdf.ln(3)
+        elif kind == "heading":
+            pdf.set_font("Arial", "B", 12)
+            pdf.ln(4)
+            pdf.multi_cell(0, 8, text.upper())
+            pdf.ln(1)
+        elif kind in ("item", "label"):
+            pdf.set_font("Arial", "B", 11)
+            pdf.multi_cell(0, 7, text)
+        else:
+            pdf.set_font("Arial", "", 11)
+            pdf.multi_cell(0, 7, text)
+
+    out = pdf.output(dest="S")  # str on PyFPDF, bytearray on fpdf2
+    return out.encode("latin-1") if isinstance(out, str) else bytes(out)
+
+
+def section_cache():
+    global _section_cache
+    with _section_cache_lock:
+        if _section_cache is None:
+            _section_cache = DiskCache(os.path.join(CACHE_DIR, "memo_sections.sqlite3"), SECTION_CACHE_MAX_BYTES,
+                                       ttl=SECTION_CACHE_TTL_SECONDS)
+        return _section_cache
+
+
+def section_cache_stats():
+    return section_cache().stats()
+
+
+def section_cache_key(item, facts, juris_codes, appellate_only, is_suppression, model=DEFAULT_MODEL):
+    """Hash of every input to a memo section; position in the issue/defense list plays no part."""
+    payload = json.dumps([SECTION_CACHE_VERSION, item["title"], item["argument"], facts, sorted(set(juris_codes)),
+                          bool(appellate_only), bool(is_suppression), model])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def caselaw_markdown(cases):
+    case_md_list = []
+    for c in cases:
+        bb = bluebook_citation(c)
+        if c.get('summary'):
+            bb += f" — {c['summary']}"
+        case_md_list.append(bb)
+    return "\n".join(case_md_list)
+
+
+def split_rebuttal(memo_full):
+    main, rebuttal = memo_full, ""
+    if memo_full and "Counterarguments and Rebuttal:" in memo_full:
+        parts = memo_full.split("Counterarguments and Rebuttal:")
+        main = parts[0].strip()
+        rebuttal = parts[1].strip() if len(parts) > 1 else ""
+    return main, rebuttal
+
+
+def build_memo_section(item, facts, juris_codes, juris_label, appellate_only,
+                       is_suppression=True, on_text=None):
+    """Search caselaw for one issue/defense box and draft its memo section (or reuse a cached one)."""
+    key = section_cache_key(item, facts, juris_codes, appellate_only, is_suppression)
+    with span("memo.section", title=item["title"], suppression=is_suppression, cache_hit=False) as s:
+        if SECTION_CACHE_ENABLED:
+            cached = section_cache().get(key)
+            if cached is not None:
+                s.set(cache_hit=True)
+                return json.loads(cached)
+        section, complete = _build_memo_section(item, facts, juris_codes, juris_label, appellate_only,
+                                                is_suppression, on_text)
+    # A section drafted from a partial caselaw search (outage, open breaker, deadline)
+    # is returned but not cached, so the next run searches again
+    if SECTION_CACHE_ENABLED and complete:
+        section_cache().set(key, json.dumps(section))
+    return section
+
+
+def _build_memo_section(item, facts, juris_codes, juris_label, appellate_only, is_suppression, on_text):
+    search_arg = f"{item['title']} {item['argument']}".strip()
+    cases, complete = search_caselaw(search_arg,
+                                     juris_codes,
+                                     limit=4,
+                                     appellate_only=appellate_only)
+    memo_full = gpt_argument_and_rebuttal(item['title'],
+                                          item['argument'],
+                                          facts, juris_label,
+                                          caselaw_markdown(cases),
+                                          is_suppression,
+                                          on_text=on_text)
+    main, rebuttal = split_rebuttal(memo_full)
+    return {
+        "title": item["title"],
+        "argument": main,
+        "cases": cases,
+        "rebuttal": rebuttal
+    }, complete
+
+
+def build_memo_sections(jobs, facts, juris_codes, juris_label, appellate_only,
+                        max_workers=MEMO_SECTION_CONCURRENCY, on_text=None, on_section=None):
+    """Build memo sections for (item, is_suppression) jobs concurrently; returns them in job order.
+
+    Each worker searches caselaw for a section and then drafts it, so later
+    sections' searches overlap earlier sections' drafting. Callbacks run on the
+    calling thread: on_text(index, text) with a draft so far as it streams in,
+    on_section(index, section) as each section finishes. Once every job has
+    settled, the first failure (if any) is raised.
+    """
+    sections = [None] * len(jobs)
+    if not jobs:
+        return sections
+    drafts = queue.Queue()
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs))), thread_name_prefix="memo-section") as pool:
+        futures = {
+            pool.submit(bind(build_memo_section), item, facts, juris_codes, juris_label, appellate_only,
+                        is_suppression, (lambda text, i=idx: drafts.put((i, text))) if on_text else None): idx
+            for idx, (item, is_suppression) in enumerate(jobs)
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.25)
+            latest = {}
+            while not drafts.empty():
+                idx, text = drafts.get_nowait()
+                latest[idx] = text
+            for idx, text in latest.items():
+                if sections[idx] is None:
+                    on_text(idx, text)
+            for future in sorted(done, key=futures.get):
+                idx = futures[future]
+                try:
+                    sections[idx] = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if on_section is not None:
+                    on_section(idx, sections[idx])
+    if errors:
+        raise errors[0]
+    return sections
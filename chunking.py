@@ -0,0 +1,127 @@
+import re
+
+from backends import backend
+
+# Sized so a chunk's verbatim fact list still fits in the model's output budget
+CHUNK_TARGET_TOKENS = 6000
+CHUNK_OVERLAP_TOKENS = 100
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+_UNLOADED = object()
+_tiktoken = _UNLOADED
+
+
+def _load_tiktoken():
+    """tiktoken, imported on first use; None if it isn't installed."""
+    global _tiktoken
+    if _tiktoken is _UNLOADED:
+        try:
+            _tiktoken = backend("tiktoken")
+        except ImportError:  # fall back to a character-based estimate
+            _tiktoken = None
+    return _tiktoken
+
+
+def _encoding(model):
+    tiktoken = _load_tiktoken()
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def token_counter(model="gpt-4o"):
+    if _load_tiktoken() is None:
+        return lambda text: (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    encoding = _encoding(model)
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def _hard_split(text, max_tokens, model):
+    """Last resort for a single sentence longer than the budget."""
+    if _load_tiktoken() is None:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    encoding = _encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def split_units(text, max_tokens, count, model="gpt-4o"):
+    """Break text into (text, tokens, separator) units: whole paragraphs, else sentences."""
+    units = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count(paragraph)
+        if tokens <= max_tokens:
+            units.append((paragraph, tokens, "\n\n"))
+            continue
+        sep = "\n\n"
+        for sentence in _SENTENCE_BREAK.split(paragraph):
+            pieces = [sentence] if count(sentence) <= max_tokens else _hard_split(sentence, max_tokens, model)
+            for piece in pieces:
+                units.append((piece, count(piece), sep))
+                sep = " "
+    return units
+
+
+def _render(header, units):
+    body = units[0][0] + "".join(sep + text for text, _, sep in units[1:])
+    return f"{header}\n{body}"
+
+
+def chunk_sources(sources, max_tokens=CHUNK_TARGET_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, model="gpt-4o"):
+    """Pack (header, text) sources into chunks of about `max_tokens` model tokens.
+
+    Chunks hold whole paragraphs (or sentences, for oversized paragraphs), small
+    sources share a chunk, and a source that spills into the next chunk is resumed
+    under its header marked "(continued)" after up to `overlap_tokens` of repeated
+    context.
+    """
+    count = token_counter(model)
+    chunks = []
+    current, current_tokens = [], 0
+
+    for header, text in sources:
+        header_tokens = count(header) + 1
+        units = split_units(text, max(max_tokens - header_tokens - overlap_tokens, 1), count, model)
+        if not units:
+            continue
+        section_header, section, section_tokens = header, [], header_tokens
+        for unit in units:
+            unit_tokens = unit[1]
+            if current_tokens + section_tokens + unit_tokens > max_tokens and (current or section):
+                if section:
+                    current.append(_render(section_header, section))
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+                overlap = []
+                if section:
+                    section_header = f"{header} (continued)"
+                    budget = overlap_tokens
+                    for prev in reversed(section):
+                        if prev[1] > budget:
+                            break
+                        overlap.insert(0, prev)
+                        budget -= prev[1]
+                section = overlap
+                section_tokens = count(section_header) + 1 + sum(u[1] for u in overlap)
+            section.append(unit)
+            section_tokens += unit_tokens
+        current.append(_render(section_header, section))
+        current_tokens += section_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def split_segment(segment):
+    """Split a "[filename]\\ntext" parsed segment into its header and body."""
+    header, _, body = segment.partition("\n")
+    return header, body
@@ -0,0 +1,323 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import http_client
+from disk_cache import CACHE_DIR, DiskCache
+from telemetry import bind, span
+
+# CourtListener opinion search, shared by the Phase 3 page and the batch CLI
+
+COURTLISTENER_API_URL = os.getenv("COURTLISTENER_API_URL", "https://www.courtlistener.com/api/rest/v3")
+# Threads fanning one search out across jurisdictions; http_client separately caps
+# requests in flight to CourtListener across all searches in the process
+COURTLISTENER_FANOUT_WORKERS = 16
+# Overall time budget for one search; jurisdictions still pending are dropped
+COURTLISTENER_DEADLINE_SECONDS = float(os.getenv("COURTLISTENER_DEADLINE_SECONDS", "20"))
+
+# Search results cache: served as-is while fresh, served and refreshed in the
+# background while stale, refetched once past fresh + stale
+SEARCH_CACHE_ENABLED = os.getenv("COURTLISTENER_CACHE_DISABLED", "") not in ("1", "true", "yes")
+SEARCH_CACHE_FRESH_SECONDS = float(os.getenv("COURTLISTENER_CACHE_TTL_HOURS", "168")) * 3600
+SEARCH_CACHE_STALE_SECONDS = float(os.getenv("COURTLISTENER_CACHE_STALE_HOURS", "720")) * 3600
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("COURTLISTENER_CACHE_MAX_MB", "64")) * 1024 * 1024
+SEARCH_CACHE_VERSION = 1
+_search_cache = None
+_search_cache_lock = threading.Lock()
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="courtlistener-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Query planning: jurisdictions are searched several courts per request, and
+# results are split back out per jurisdiction afterwards
+COURTS_PER_REQUEST = int(os.getenv("COURTLISTENER_COURTS_PER_REQUEST", "10"))
+MAX_PAGE_SIZE = 100
+# Page size per court in a grouped request, as a multiple of the per-jurisdiction quota
+GROUP_OVERFETCH = 2
+_FEDERAL_COURT = re.compile(r"^(scotus|ca\d+|cadc|cafc)$")
+
+# CourtListener court ids of the opinions each jurisdiction search returns, used to
+# attribute results of a grouped search; federal codes are their own court id
+JURISDICTION_COURTS = {
+    "alabama": ("ala", "alactapp", "alacrimapp", "alacivapp"),
+    "alaska": ("alaska", "alaskactapp"),
+    "arizona": ("ariz", "arizctapp"),
+    "arkansas": ("ark", "arkctapp"),
+    "california": ("cal", "calctapp", "calappdeptsuper"),
+    "colorado": ("colo", "coloctapp"),
+    "connecticut": ("conn", "connappct", "connsuperct"),
+    "delaware": ("del", "delch", "delsuperct", "delfamct"),
+    "dc": ("dc", ),
+    "florida": ("fla", "fladistctapp"),
+    "georgia": ("ga", "gactapp"),
+    "hawaii": ("haw", "hawapp"),
+    "idaho": ("idaho", "idahoctapp"),
+    "illinois": ("ill", "illappct"),
+    "indiana": ("ind", "indctapp", "indtc"),
+    "iowa": ("iowa", "iowactapp"),
+    "kansas": ("kan", "kanctapp"),
+    "kentucky": ("ky", "kyctapp", "kyctapphigh"),
+    "louisiana": ("la", "lactapp"),
+    "maine": ("me", ),
+    "maryland": ("md", "mdctspecapp"),
+    "massachusetts": ("mass", "massappct"),
+    "michigan": ("mich", "michctapp"),
+    "minnesota": ("minn", "minnctapp"),
+    "mississippi": ("miss", "missctapp"),
+    "missouri": ("mo", "moctapp"),
+    "montana": ("mont", ),
+    "nebraska": ("neb", "nebctapp"),
+    "nevada": ("nev", "nevapp"),
+    "new_hampshire": ("nh", ),
+    "new_jersey": ("nj", "njsuperctappdiv", "njtaxct"),
+    "new_mexico": ("nm", "nmctapp"),
+    "new_york": ("ny", "nyappdiv", "nyappterm", "nysupct"),
+    "north_carolina": ("nc", "ncctapp"),
+    "north_dakota": ("nd", "ndctapp"),
+    "ohio": ("ohio", "ohioctapp"),
+    "oklahoma": ("okla", "oklacrimapp", "oklacivapp"),
+    "oregon": ("or", "orctapp"),
+    "pennsylvania": ("pa", "pasuperct", "pacommwct"),
+    "rhode_island": ("ri", ),
+    "south_carolina": ("sc", "scctapp"),
+    "south_dakota": ("sd", ),
+    "tennessee": ("tenn", "tennctapp", "tenncrimapp"),
+    "texas": ("tex", "texapp", "texcrimapp"),
+    "utah": ("utah", "utahctapp"),
+    "vermont": ("vt", ),
+    "virginia": ("va", "vactapp"),
+    "washington": ("wash", "washctapp"),
+    "west_virginia": ("wva", ),
+    "wisconsin": ("wis", "wisctapp"),
+    "wyoming": ("wyo", ),
+    "pr": ("prsupreme", "prapp"),
+    "as": ("amsamoa", "amsamoatc"),
+    "gu": ("guam", ),
+    "mp": ("nmariana", "cnmisuperct", "cnmitrialct"),
+    "vi": ("vi", "visuper"),
+}
+
+
+def dedup_citations(cases):
+    unique = {}
+    for c in cases:
+        key = (c.get("citation", ""), c.get("court", ""))
+        if key not in unique and c.get("case_name"):
+            unique[key] = c
+    return list(unique.values())
+
+
+def case_from_search_result(item):
+    case_name = item.get("caseName") or item.get("case_name") or ""
+    citation = item.get("citation", "")
+    court = item.get("court", {}).get("name", "")
+    date_val = item.get("dateFiled", item.get("date_filed", ""))
+    url = item.get("absolute_url", "")
+    summary = item.get("plain_text", "")
+    if summary:
+        summary = summary[:350].replace("\n", " ") + ("..." if len(summary) > 340 else "")
+    return {
+        "case_name": case_name,
+        "citation": citation,
+        "court": court,
+        "date": date_val,
+        "url": f"https://www.courtlistener.com{url}" if url else "",
+        "summary": summary
+    }
+
+
+def _search(arg, courts, page_size, appellate_only):
+    params = {
+        "q": arg,
+        "type": "o",
+        "page_size": page_size,
+        "order_by": "-date_filed",
+        "jurisdiction": courts,
+    }
+    if appellate_only:
+        params["court_type"] = "A"  # "A" for appellate courts; omit for all
+    r = http_client.get("courtlistener", f"{COURTLISTENER_API_URL}/search/", params=params)
+    r.raise_for_status()
+    return r.json()
+
+
+def search_jurisdiction(arg, juris_code, limit=4, appellate_only=False):
+    """One CourtListener search in one jurisdiction; raises on network errors and non-200 responses."""
+    return [case_from_search_result(item) for item in _search(arg, juris_code, limit, appellate_only).get("results", [])]
+
+
+def court_ids(juris_code):
+    return JURISDICTION_COURTS.get(juris_code, (juris_code, ))
+
+
+def _result_jurisdiction(item, courts):
+    """The selected jurisdiction a result belongs to, via its court id; None if it can't be told."""
+    court = item.get("court")
+    for court_id in (item.get("court_id"), court.get("id") if isinstance(court, dict) else None):
+        if court_id in courts:
+            return courts[court_id]
+    return None
+
+
+def search_jurisdictions(arg, codes, limit=4, appellate_only=False):
+    """Search several jurisdictions in one request; returns {code: up to `limit` cases}.
+
+    Results are redistributed per jurisdiction by court id (see JURISDICTION_COURTS).
+    If busier courts crowd the page so some jurisdiction gets fewer than `limit`
+    hits while more results exist, those jurisdictions are searched again in
+    smaller groups, so each still gets its full quota. If the page held results
+    whose court can't be attributed, splitting the group wouldn't help, so the
+    short jurisdictions are searched one at a time instead.
+    """
+    if len(codes) == 1:
+        return {codes[0]: search_jurisdiction(arg, codes[0], limit, appellate_only)}
+    data = _search(arg, " ".join(codes), min(limit * len(codes) * GROUP_OVERFETCH, MAX_PAGE_SIZE), appellate_only)
+    results = data.get("results", [])
+    courts = {court_id: code for code in codes for court_id in court_ids(code)}
+    buckets = {code: [] for code in codes}
+    unattributed = 0
+    for item in results:
+        code = _result_jurisdiction(item, courts)
+        if code is None:
+            unattributed += 1
+        elif len(buckets[code]) < limit:
+            buckets[code].append(case_from_search_result(item))
+    exhausted = data.get("count", 0) <= len(results) and not data.get("next")
+    starved = [code for code in codes if len(buckets[code]) < limit]
+    if starved and (unattributed or not exhausted):
+        if unattributed:
+            groups = [[code] for code in starved]
+        else:
+            half = max(len(starved) // 2, 1)
+            groups = [group for group in (starved[:half], starved[half:]) if group]
+        for group in groups:
+            buckets.update(search_jurisdictions(arg, group, limit, appellate_only))
+    return buckets
+
+
+def plan_requests(codes, max_courts=COURTS_PER_REQUEST):
+    """Group jurisdiction codes into as few search requests as possible.
+
+    Federal and state courts are grouped separately, since a busy state system
+    would otherwise crowd federal appellate hits out of a shared page.
+    """
+    federal = [code for code in codes if _FEDERAL_COURT.match(code)]
+    state = [code for code in codes if not _FEDERAL_COURT.match(code)]
+    return [family[i:i + max_courts] for family in (federal, state) for i in range(0, len(family), max_courts)]
+
+
+def search_cache():
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = DiskCache(os.path.join(CACHE_DIR, "courtlistener.sqlite3"), SEARCH_CACHE_MAX_BYTES,
+                                      ttl=SEARCH_CACHE_FRESH_SECONDS + SEARCH_CACHE_STALE_SECONDS)
+        return _search_cache
+
+
+def search_cache_stats():
+    return search_cache().stats()
+
+
+def normalize_query(arg):
+    return " ".join(arg.lower().split())
+
+
+def search_cache_key(arg, juris_code, limit, appellate_only):
+    return json.dumps([SEARCH_CACHE_VERSION, normalize_query(arg), juris_code, bool(appellate_only), limit])
+
+
+def _refresh(key, arg, juris_code, limit, appellate_only):
+    try:
+        search_cache().set(key, json.dumps(search_jurisdiction(arg, juris_code, limit, appellate_only)))
+    except Exception:
+        pass  # keep serving the stale entry; the next lookup tries again
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def _cached_results(arg, juris_code, limit, appellate_only):
+    """Cached cases for a jurisdiction (refreshing stale ones in the background), or None on a miss."""
+    key = search_cache_key(arg, juris_code, limit, appellate_only)
+    entry = search_cache().get_entry(key)
+    if entry is None:
+        return None
+    value, age = entry
+    if age > SEARCH_CACHE_FRESH_SECONDS:
+        with _refreshing_lock:
+            start_refresh = key not in _refreshing
+            _refreshing.add(key)
+        if start_refresh:
+            _refresh_pool.submit(_refresh, key, arg, juris_code, limit, appellate_only)
+    return json.loads(value)
+
+
+def _search_and_cache(arg, codes, limit, appellate_only):
+    found = search_jurisdictions(arg, codes, limit, appellate_only)
+    if SEARCH_CACHE_ENABLED:
+        for code, cases in found.items():
+            search_cache().set(search_cache_key(arg, code, limit, appellate_only), json.dumps(cases))
+    return found
+
+
+def fetch_caselaw_from_courtlistener(arg,
+                                     jurisdictions,
+                                     limit=4,
+                                     appellate_only=False,
+                                     deadline=COURTLISTENER_DEADLINE_SECONDS):
+    """Get up-to-`limit` caselaw hits per jurisdiction (deduped).
+
+    Jurisdictions not already cached are grouped several courts per request (see
+    plan_requests) and the groups are searched concurrently (http_client caps
+    requests in flight per host). Whatever has arrived by `deadline` seconds is
+    returned; results keep the order of `jurisdictions`, then CourtListener's
+    order within each.
+    """
+    return search_caselaw(arg, jurisdictions, limit, appellate_only, deadline)[0]
+
+
+def search_caselaw(arg, jurisdictions, limit=4, appellate_only=False, deadline=COURTLISTENER_DEADLINE_SECONDS):
+    """Like fetch_caselaw_from_courtlistener, but returns (cases, complete).
+
+    `complete` is False when any planned request failed or missed the deadline,
+    so the cases may be missing some jurisdictions.
+    """
+    with span("courtlistener.search", jurisdictions=len(jurisdictions), requests=0) as s:
+        cases, complete = _fetch_caselaw(arg, jurisdictions, limit, appellate_only, deadline, s)
+        s.set(results=len(cases), complete=complete)
+    return cases, complete
+
+
+def _fetch_caselaw(arg, jurisdictions, limit, appellate_only, deadline, search_span):
+    per_jurisdiction = {}
+    complete = True
+    if SEARCH_CACHE_ENABLED:
+        for code in jurisdictions:
+            cached = _cached_results(arg, code, limit, appellate_only)
+            if cached is not None:
+                per_jurisdiction[code] = cached
+        search_span.set(cache_hits=len(per_jurisdiction))
+    plan = plan_requests([code for code in dict.fromkeys(jurisdictions) if code not in per_jurisdiction])
+    search_span.set(planned_requests=len(plan))
+    if plan:
+        pool = ThreadPoolExecutor(max_workers=min(len(plan), COURTLISTENER_FANOUT_WORKERS))
+        try:
+            futures = [pool.submit(bind(_search_and_cache), arg, group, limit, appellate_only) for group in plan]
+            done, not_done = wait(futures, timeout=deadline)
+            for future in done:
+                search_span.add("requests")
+                try:
+                    per_jurisdiction.update(future.result())
+                except Exception:
+                    search_span.add("errors")
+                    complete = False
+            if not_done:
+                search_span.set(timed_out=len(not_done))
+                complete = False
+        finally:
+            # Don't hold the section up on stragglers past the deadline
+            pool.shutdown(wait=False, cancel_futures=True)
+    return dedup_citations([case for code in jurisdictions for case in per_jurisdiction.get(code, [])]), complete
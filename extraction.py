@@ -0,0 +1,266 @@
+import mimetypes
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+
+import audio_tools
+import ocr_engine
+from assemblyai_client import TRANSCRIPTION_CANCELLED, copy_in_chunks, get_job, transcribe_file
+from audio_tools import extract_asr_audio, has_audio_track
+from backends import backend
+from disk_cache import CACHE_DIR, DiskCache, hash_file
+from ocr_engine import extract_pdf_text_hybrid, iter_ocr_pdf_pages
+from telemetry import span
+
+# Streamlit-free text extraction, safe to run from worker threads. Progress is
+# reported through a `progress(message)` callback instead of st.* calls.
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+
+# Cap on transcriptions in flight at once, shared by every caller in the process
+MAX_CONCURRENT_TRANSCRIPTIONS = int(os.getenv("MAX_CONCURRENT_TRANSCRIPTIONS", "3"))
+_transcription_slots = threading.BoundedSemaphore(MAX_CONCURRENT_TRANSCRIPTIONS)
+
+# Parsed text and transcripts, keyed by file content hash plus extraction settings.
+# Bump the version whenever extraction output changes for the same settings.
+EXTRACTION_CACHE_VERSION = 1
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "512")) * 1024 * 1024
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+# Extractions running right now, by (job key, cache key), so a Streamlit rerun
+# that asks for the same upload while an earlier run's worker is still
+# transcribing it waits for that result instead of uploading the file again.
+# Scoped to the job key, so other sessions and API jobs never share a result.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _no_progress(message):
+    pass
+
+
+def is_video(name, mime_type):
+    return mime_type.startswith("video/") or name.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def is_audio(name, mime_type):
+    return "audio" in mime_type
+
+
+def file_kind(name, mime_type):
+    if is_video(name, mime_type):
+        return "video"
+    if "pdf" in mime_type or name.lower().endswith(".pdf"):
+        return "pdf"
+    if "word" in mime_type or name.endswith(".docx"):
+        return "docx"
+    if is_audio(name, mime_type):
+        return "audio"
+    return None
+
+
+def extraction_cache():
+    global _extraction_cache
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = DiskCache(os.path.join(CACHE_DIR, "extraction.sqlite3"), EXTRACTION_CACHE_MAX_BYTES)
+        return _extraction_cache
+
+
+def extraction_cache_key(file, kind, pdf_mode, content_hash=None):
+    if kind == "pdf":
+        settings = f"{pdf_mode}:{ocr_engine.OCR_DPI}:{ocr_engine.OCR_CONFIG}"
+    elif kind in ("audio", "video"):
+        settings = f"{audio_tools.ASR_SAMPLE_RATE}:{audio_tools.ASR_BITRATE}:{audio_tools.ASR_FORMAT}"
+    else:
+        settings = ""
+    return f"v{EXTRACTION_CACHE_VERSION}:{kind}:{settings}:{content_hash or hash_file(file)}"
+
+
+def spool_to_temp_file(file, suffix):
+    file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        copy_in_chunks(file, temp_file)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+        return temp_file.name
+
+
+def parse_pdf_text(file):
+    with span("pdf.text") as s:
+        file.seek(0)
+        doc = backend("fitz").open(stream=file.read(), filetype="pdf")
+        s.set(pages=doc.page_count)
+        page_texts = (page.get_text() for page in doc)
+        return "\n".join(text for text in page_texts if text)
+
+
+def run_ocr_on_pdf(file, workers=None):
+    pdf_path = spool_to_temp_file(file, ".pdf")
+    try:
+        with span("pdf.ocr") as s:
+            texts = [text for _, text in iter_ocr_pdf_pages(pdf_path, workers=workers)]
+            s.set(pages=len(texts))
+        return "\n".join(texts)
+    finally:
+        os.remove(pdf_path)
+
+
+def parse_pdf_hybrid(file, workers=None, progress=_no_progress):
+    pdf_path = spool_to_temp_file(file, ".pdf")
+    try:
+        with span("pdf.hybrid") as s:
+            text, ocr_pages = extract_pdf_text_hybrid(pdf_path, workers=workers)
+            s.set(ocr_pages=len(ocr_pages))
+    finally:
+        os.remove(pdf_path)
+    if ocr_pages:
+        progress(f"OCR applied to {len(ocr_pages)} image-only page(s): {', '.join(map(str, ocr_pages))}")
+    return text
+
+
+def parse_docx(file):
+    with span("docx.parse"):
+        return "\n".join([p.text for p in backend("docx").Document(file).paragraphs])
+
+
+def transcribe_media(path, api_key, job=None, progress=_no_progress):
+    """Transcribe under a transcription slot; a job cancelled before it gets one never uploads."""
+    if job is not None and job.cancelled.is_set():
+        return TRANSCRIPTION_CANCELLED
+    progress("Waiting for a transcription slot...")
+    with span("transcription.slot_wait"):
+        _transcription_slots.acquire()
+    try:
+        if job is not None and job.cancelled.is_set():
+            return TRANSCRIPTION_CANCELLED
+        progress("Transcribing audio...")
+        return transcribe_file(path, api_key, job=job,
+                               on_poll=lambda status, elapsed: progress(f"AssemblyAI status: {status} ({elapsed:.0f}s)"))
+    finally:
+        _transcription_slots.release()
+
+
+def extract_text(file, name, mime_type, assemblyai_api_key, pdf_mode="hybrid", job_key=None,
+                 progress=_no_progress, on_audio_ready=None, use_cache=True, content_hash=None):
+    """Extract text from a PDF, DOCX, audio or video file object.
+
+    Errors are returned as "[...]" strings, matching the rest of the pipeline.
+    `on_audio_ready(path)` is called with the extracted audio of a video before upload.
+    Successful results are cached on disk by content hash, so repeat calls are free;
+    pass `content_hash` (the file's SHA-256) when it is already known to skip re-hashing.
+    """
+    mime_type = mime_type or mimetypes.guess_type(name)[0] or ""
+    kind = file_kind(name, mime_type)
+    if kind is None:
+        return "[Unsupported file type]"
+    file.seek(0, os.SEEK_END)
+    with span("extract", file=name, kind=kind, bytes=file.tell()) as s:
+        file.seek(0)
+        if not use_cache:
+            return _extract_text_uncached(file, name, kind, assemblyai_api_key, pdf_mode, job_key, progress,
+                                          on_audio_ready)
+
+        cache = extraction_cache()
+        key = extraction_cache_key(file, kind, pdf_mode, content_hash)
+        cached = cache.get(key)
+        s.set(cache_hit=cached is not None)
+        if cached is not None:
+            progress("Loaded from cache")
+            return cached
+
+        def extract_and_cache():
+            parsed = _extract_text_uncached(file, name, kind, assemblyai_api_key, pdf_mode, job_key, progress,
+                                            on_audio_ready)
+            if parsed.strip() and not parsed.startswith("["):
+                cache.set(key, parsed)
+            return parsed
+
+        if job_key is None:
+            return extract_and_cache()
+        return _extract_once((job_key, key), extract_and_cache, progress)
+
+
+def _extract_once(key, extract, progress):
+    """Run `extract()` unless an extraction for `key` is already running; then wait for its result.
+
+    If the running extraction was cancelled, the waiter runs its own instead.
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        progress("Already being extracted by an earlier run; waiting for it...")
+        parsed = future.result()
+        if parsed != TRANSCRIPTION_CANCELLED:
+            return parsed
+        return _extract_once(key, extract, progress)
+    try:
+        parsed = extract()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(parsed)
+        return parsed
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _extract_text_uncached(file, name, kind, assemblyai_api_key, pdf_mode, job_key, progress, on_audio_ready):
+    parsed = ""
+    temp_paths = []
+    # Registered before any ffmpeg work, so a cancel that arrives meanwhile is seen
+    job = get_job(job_key) if job_key and kind in ("audio", "video") else None
+    if kind == "video":
+        progress("Extracting audio from video...")
+        ext = os.path.splitext(name)[1].lower() or ".mp4"
+        temp_video_path = spool_to_temp_file(file, ext)
+        temp_paths.append(temp_video_path)
+
+        try:
+            if not has_audio_track(temp_video_path):
+                return "[Error: No audio stream detected.]"
+
+            audio_path = extract_asr_audio(temp_video_path)
+            if audio_path.startswith("[Audio extraction failed"):
+                return audio_path
+            temp_paths.append(audio_path)
+
+            if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
+                return "[Transcription Error: Extracted audio file is missing or empty.]"
+
+            if on_audio_ready:
+                on_audio_ready(audio_path)
+            parsed = transcribe_media(audio_path, assemblyai_api_key, job, progress)
+        finally:
+            for path in temp_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    elif kind == "pdf":
+        if pdf_mode == "hybrid":
+            parsed = parse_pdf_hybrid(file, progress=progress)
+        elif pdf_mode == "ocr":
+            progress("Running OCR...")
+            parsed = run_ocr_on_pdf(file)
+        else:
+            parsed = parse_pdf_text(file)
+            if not parsed.strip():
+                progress("No embedded text, running OCR...")
+                parsed = run_ocr_on_pdf(file)
+    elif kind == "docx":
+        parsed = parse_docx(file)
+    elif kind == "audio":
+        ext = os.path.splitext(name)[1].lower()
+        tmp_path = spool_to_temp_file(file, ext)
+        try:
+            parsed = transcribe_media(tmp_path, assemblyai_api_key, job, progress)
+        finally:
+            os.remove(tmp_path)
+    return parsed
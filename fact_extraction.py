@@ -0,0 +1,81 @@
+import os
+
+from chunking import CHUNK_OVERLAP_TOKENS, CHUNK_TARGET_TOKENS, chunk_sources, split_segment
+from llm_client import DEFAULT_MODEL, make_client, map_chat_completions
+from telemetry import span
+
+# Chunks sent to the model at once when extracting facts
+FACT_EXTRACTION_CONCURRENCY = int(os.getenv("FACT_EXTRACTION_CONCURRENCY", "6"))
+
+FACT_EXTRACTION_SYSTEM_PROMPT = "You extract and present only the original facts in strict chronological order for legal suppression review. Do not enhance."
+
+
+def fact_extraction_messages(chunk, idx, total, case_name, case_number):
+    prompt = f"""Using only the exact facts from the following material — without combining, summarizing, or paraphrasing — extract every individual event and action exactly as written, in strict chronological order.
+
+CASE NAME: {case_name}
+CASE NUMBER: {case_number}
+SOURCE MATERIAL (PART {idx+1} of {total}):
+
+{chunk}
+"""
+    return [
+        {"role": "system", "content": FACT_EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def extract_facts_chunked(segments, case_name, case_number, api_key, max_tokens=CHUNK_TARGET_TOKENS,
+                          overlap_tokens=CHUNK_OVERLAP_TOKENS, max_workers=FACT_EXTRACTION_CONCURRENCY,
+                          on_chunk_done=None):
+    """Extract facts from "[filename]\ntext" segments and merge them in chunk order.
+
+    Segments are packed into token-budgeted chunks on paragraph/sentence boundaries
+    and the chunks are sent to the model concurrently.
+
+    `on_chunk_done(completed, total)` is called from the calling thread. Chunks that
+    still fail after retries are sent once more. Returns (facts, failed_chunks):
+    the facts from every chunk that succeeded, and the 1-based numbers of chunks
+    whose facts are missing. When no facts could be extracted at all, facts is a
+    "[...]" error string.
+    """
+    if not api_key:
+        return "[OpenAI API key not set. Cannot extract facts.]", []
+    with span("facts.extract", sources=len(segments)) as s:
+        return _extract_facts_chunked(segments, case_name, case_number, api_key, max_tokens, overlap_tokens,
+                                      max_workers, on_chunk_done, s)
+
+
+def _extract_facts_chunked(segments, case_name, case_number, api_key, max_tokens, overlap_tokens, max_workers,
+                           on_chunk_done, facts_span):
+    client = make_client(api_key)
+    with span("facts.chunk"):
+        chunks = chunk_sources([split_segment(s) for s in segments], max_tokens, overlap_tokens, DEFAULT_MODEL)
+    facts_span.set(chunks=len(chunks))
+    message_lists = [
+        fact_extraction_messages(chunk, idx, len(chunks), case_name, case_number)
+        for idx, chunk in enumerate(chunks)
+    ]
+    completed = 0
+
+    def chunk_done(idx, result):
+        nonlocal completed
+        completed += 1
+        if on_chunk_done:
+            on_chunk_done(completed, len(chunks))
+
+    results = map_chat_completions(client, message_lists, max_workers, on_done=chunk_done, temperature=0.0)
+    failed = [idx for idx, r in enumerate(results) if isinstance(r, Exception)]
+    if failed:
+        # One more pass over just the failed chunks, e.g. after a burst of 429s has cleared
+        retried = map_chat_completions(client, [message_lists[idx] for idx in failed], max_workers,
+                                       temperature=0.0)
+        for idx, result in zip(failed, retried):
+            results[idx] = result
+        failed = [idx for idx, r in enumerate(results) if isinstance(r, Exception)]
+        facts_span.set(failed_chunks=len(failed))
+    failed_chunks = [idx + 1 for idx in failed]
+    if failed and len(failed) == len(chunks):
+        return f"[GPT Error in all {len(chunks)} chunk(s): {results[failed[0]]}]", failed_chunks
+    facts = "\n\n".join((r or "").strip() for r in results if not isinstance(r, Exception))
+    return facts, failed_chunks
@@ -0,0 +1,194 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from telemetry import span
+
+# One keep-alive connection pool per upstream, shared by every thread in the
+# process, with consistent timeouts, jittered retries and a circuit breaker.
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+# (connect, read) seconds
+UPSTREAM_TIMEOUTS = {
+    "assemblyai": (10, 120),
+    "courtlistener": (5, 10),
+    "exonascope_api": (10, 300),
+}
+DEFAULT_TIMEOUT = (10, 60)
+
+# Requests in flight at once per upstream host, across every thread in the process
+UPSTREAM_CONCURRENCY = {
+    "courtlistener": int(os.getenv("COURTLISTENER_MAX_CONCURRENCY", "8")),
+}
+
+HTTP_MAX_RETRIES = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+# Consecutive failures (connection errors, timeouts, 5xx) that open a breaker,
+# and how long it stays open before letting a trial request through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError while open; once the reset period passes, let one trial call through.
+
+        A trial that never reports back is given up on after another reset period.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            trial_pending = self._trial_started is not None and now - self._trial_started < self.reset_seconds
+            if now - self.opened_at < self.reset_seconds or trial_pending:
+                raise CircuitOpenError(f"{self.name} circuit open after {self.failures} consecutive failures")
+            self._trial_started = now
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_started = None
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_sessions = {}
+_breakers = {}
+_slots = {upstream: threading.BoundedSemaphore(limit) for upstream, limit in UPSTREAM_CONCURRENCY.items()}
+_registry_lock = threading.Lock()
+
+
+def breaker(upstream):
+    with _registry_lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker(upstream)
+        return _breakers[upstream]
+
+
+def session(upstream):
+    """The shared keep-alive Session for an upstream."""
+    with _registry_lock:
+        if upstream not in _sessions:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessions[upstream] = s
+        return _sessions[upstream]
+
+
+def breaker_states():
+    with _registry_lock:
+        breakers = dict(_breakers)
+    return {name: {"state": b.state, "failures": b.failures} for name, b in breakers.items()}
+
+
+def retry_delay(attempt, response=None):
+    """Honor Retry-After when the server sends one, else exponential backoff with full jitter."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return min(float(retry_after), RETRY_MAX_DELAY)
+    except (TypeError, ValueError):
+        return random.uniform(0, min(RETRY_BASE_DELAY * 2**attempt, RETRY_MAX_DELAY))
+
+
+def request(upstream, method, url, retries=None, timeout=None, **kwargs):
+    """Send a request through the upstream's pooled session and circuit breaker.
+
+    Connection errors, timeouts and 429/5xx responses are retried with jittered
+    backoff; by default only idempotent methods are retried (pass `retries` to
+    override, and never for one-shot streaming bodies). Returns the last response,
+    whatever its status, or raises the last connection error / CircuitOpenError.
+    """
+    method = method.upper()
+    if retries is None:
+        retries = HTTP_MAX_RETRIES if method in IDEMPOTENT_METHODS else 0
+    if timeout is None:
+        timeout = UPSTREAM_TIMEOUTS.get(upstream, DEFAULT_TIMEOUT)
+    upstream_breaker = breaker(upstream)
+    with span(f"http.{upstream}", method=method, retries=0) as s:
+        for attempt in range(retries + 1):
+            upstream_breaker.before_call()
+            try:
+                response = _send(upstream, method, url, timeout, kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                upstream_breaker.record_failure()
+                if attempt == retries:
+                    raise
+                s.add("retries")
+                time.sleep(retry_delay(attempt))
+                continue
+            if response.status_code >= 500:
+                upstream_breaker.record_failure()
+            else:
+                upstream_breaker.record_success()
+            s.set(status=response.status_code)
+            if response.status_code not in RETRYABLE_STATUSES or attempt == retries:
+                return response
+            s.add("retries")
+            response.close()
+            time.sleep(retry_delay(attempt, response))
+
+
+def _send(upstream, method, url, timeout, kwargs):
+    slots = _slots.get(upstream)
+    if slots is None:
+        return session(upstream).request(method, url, timeout=timeout, **kwargs)
+    with slots:
+        return session(upstream).request(method, url, timeout=timeout, **kwargs)
+
+
+def get(upstream, url, **kwargs):
+    return request(upstream, "GET", url, **kwargs)
+
+
+def post(upstream, url, **kwargs):
+    return request(upstream, "POST", url, **kwargs)
+
+
+def head(upstream, url, **kwargs):
+    return request(upstream, "HEAD", url, **kwargs)
+
+
+def patch(upstream, url, **kwargs):
+    return request(upstream, "PATCH", url, **kwargs)
+
+
+def delete(upstream, url, **kwargs):
+    return request(upstream, "DELETE", url, **kwargs)
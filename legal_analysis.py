@@ -0,0 +1,103 @@
+import ast
+import json
+import os
+import re
+
+from llm_client import chat_completion, make_client, stream_chat_completion
+
+# Phase 2 legal strategy prompts, shared by the Phase 2 page and the batch CLI.
+# Each generator takes an optional `gpt(prompt) -> str`; the default calls the
+# API directly and raises on failure.
+
+LEGAL_ASSISTANT_SYSTEM_PROMPT = "You are a precise, formal legal assistant."
+
+
+def legal_assistant_messages(prompt):
+    return [
+        {"role": "system", "content": LEGAL_ASSISTANT_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def complete_legal_prompt(prompt, api_key=None, on_text=None):
+    """Run a prompt as the legal assistant; with on_text, the text so far is passed to it as it streams in."""
+    client = make_client(api_key or os.getenv("OPENAI_API_KEY"))
+    messages = legal_assistant_messages(prompt)
+    if on_text is None:
+        return (chat_completion(client, messages, use_cache=True) or "").strip()
+    result = ""
+    for delta in stream_chat_completion(client, messages, use_cache=True):
+        result += delta
+        on_text(result)
+    return result.strip()
+
+
+def parse_ai_output(result):
+    result = result.strip()
+    if result.startswith("```"):
+        result = re.sub(r"^```(?:json)?\n?", "", result, flags=re.IGNORECASE)
+        result = re.sub(r"\n?```$", "", result)
+    try:
+        return json.loads(result)
+    except Exception:
+        try:
+            return ast.literal_eval(result)
+        except Exception:
+            return []
+
+
+def generate_suppression_issues(facts, tags, gpt=None):
+    prompt = f"""
+You are a criminal defense attorney. Based on the following raw facts and tagged events, list plausible suppression issues related to constitutional violations.
+
+For each issue, return:
+- "title" (e.g., "Unlawful Search and Seizure")
+- "explanation" (1–2 sentence summary, referencing the facts)
+
+Facts:
+{facts}
+
+Tagged Events:
+{tags}
+
+Return a JSON list of objects with "title" and "explanation".
+"""
+    result = (gpt or complete_legal_prompt)(prompt)
+    issues = parse_ai_output(result)
+    return [i for i in issues if "title" in i and "explanation" in i]
+
+
+def generate_defenses(facts, tags, gpt=None):
+    prompt = f"""
+You are a criminal defense strategist. Based on the facts and tagged legal events, identify all non-suppression legal defenses.
+
+For each defense:
+- "title" (e.g., "Mistaken Identity", "Alibi")
+- "explanation" (2–3 sentence reasoning)
+
+Facts:
+{facts}
+
+Tagged Events:
+{tags}
+
+Return a JSON list formatted with "title" and "explanation" for each defense.
+"""
+    result = (gpt or complete_legal_prompt)(prompt)
+    defenses = parse_ai_output(result)
+    return [d for d in defenses if "title" in d and "explanation" in d]
+
+
+def summarize_facts_for_motion(raw_facts, tagged_events, gpt=None):
+    prompt = f"""
+You are a legal writing assistant. Given the facts and tagged legal events below, write a clear and neutral 'Statement of Facts' for a legal motion. Be chronological and professional.
+
+Facts:
+{raw_facts}
+
+Tagged Events:
+{tagged_events}
+
+Return a formal narrative paragraph.
+"""
+    return (gpt or complete_legal_prompt)(prompt)
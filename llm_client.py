@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import http_client
+from backends import backend
+from disk_cache import CACHE_DIR, DiskCache
+from telemetry import bind, record_span, span
+
+DEFAULT_MODEL = "gpt-4o"
+
+# Response cache shared by all three phases (and every session on the box)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_DISABLED", "") not in ("1", "true", "yes")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_HOURS", "720")) * 3600
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+# Retries for rate limits (429), timeouts, dropped connections and 5xx responses
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# One client (and keep-alive connection pool) per API key, shared by every thread
+OPENAI_CONNECT_TIMEOUT = 10.0
+OPENAI_READ_TIMEOUT = 120.0
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+# openai (and httpx under it) is loaded on first use, not at import
+def retryable_errors():
+    openai = backend("openai")
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def outage_errors():
+    """Errors that count against the OpenAI circuit breaker (a 429 means the service is up)."""
+    openai = backend("openai")
+    return (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def make_client(api_key):
+    with _clients_lock:
+        if api_key not in _clients:
+            openai, httpx = backend("openai"), backend("httpx")
+            timeout = httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+            limits = httpx.Limits(max_connections=http_client.HTTP_POOL_SIZE,
+                                  max_keepalive_connections=http_client.HTTP_POOL_SIZE)
+            # We retry ourselves so Retry-After and concurrency limits are handled in one place
+            _clients[api_key] = openai.OpenAI(api_key=api_key, max_retries=0, timeout=timeout,
+                                              http_client=httpx.Client(limits=limits, timeout=timeout))
+        return _clients[api_key]
+
+
+def _create_completion(client, **kwargs):
+    """One API call through the OpenAI circuit breaker."""
+    breaker = http_client.breaker("openai")
+    breaker.before_call()
+    try:
+        response = client.chat.completions.create(**kwargs)
+    except outage_errors():
+        breaker.record_failure()
+        raise
+    except backend("openai").APIStatusError:
+        breaker.record_success()
+        raise
+    breaker.record_success()
+    return response
+
+
+def _retry_delay(error, attempt):
+    """Honor the server's Retry-After header, else exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(retry_after), RETRY_MAX_DELAY)
+    except (TypeError, ValueError):
+        return min(RETRY_BASE_DELAY * 2**attempt, RETRY_MAX_DELAY) * random.uniform(0.5, 1.0)
+
+
+def llm_cache():
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = DiskCache(os.path.join(CACHE_DIR, "llm_responses.sqlite3"), LLM_CACHE_MAX_BYTES,
+                                   ttl=LLM_CACHE_TTL_SECONDS)
+        return _llm_cache
+
+
+def llm_cache_stats():
+    return llm_cache().stats()
+
+
+def llm_cache_key(model, messages, params):
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_mode(use_cache, params):
+    """(read, write) for the response cache.
+
+    Only deterministic requests (temperature=0) are cached unless the caller opts
+    in with use_cache=True; otherwise every sampled call would replay the first
+    sample. use_cache=False skips the lookup but still refreshes the entry.
+    """
+    write = LLM_CACHE_ENABLED and (use_cache is True or params.get("temperature") == 0)
+    return write and use_cache is not False, write
+
+
+def chat_completion(client, messages, model=DEFAULT_MODEL, max_retries=MAX_RETRIES, use_cache=None, **params):
+    """Return the text of a chat completion, retrying transient failures.
+
+    Responses to temperature=0 requests (or any request, with use_cache=True) are
+    cached by model, messages and sampling params; pass use_cache=False to force
+    a fresh completion (which still refreshes the cache).
+    """
+    use_cache, write_cache = _cache_mode(use_cache, params)
+    key = llm_cache_key(model, messages, params)
+    with span("llm.chat", model=model, retries=0, cache_hit=False) as s:
+        if use_cache:
+            cached = llm_cache().get(key)
+            if cached is not None:
+                s.set(cache_hit=True)
+                return cached
+        for attempt in range(max_retries + 1):
+            try:
+                response = _create_completion(client, model=model, messages=messages, **params)
+                content = response.choices[0].message.content
+                break
+            except retryable_errors() as e:
+                if attempt == max_retries:
+                    raise
+                s.add("retries")
+                time.sleep(_retry_delay(e, attempt))
+        if response.usage is not None:
+            s.set(prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens)
+    if content and write_cache:
+        llm_cache().set(key, content)
+    return content
+
+
+def stream_chat_completion(client, messages, model=DEFAULT_MODEL, max_retries=MAX_RETRIES, use_cache=None,
+                           **params):
+    """Yield completion text as it arrives; a cached response is yielded in one piece.
+
+    Shares cache entries with chat_completion. Only opening the stream is retried,
+    never a stream that has already produced text.
+    """
+    use_cache, write_cache = _cache_mode(use_cache, params)
+    key = llm_cache_key(model, messages, params)
+    started = time.time()
+    if use_cache:
+        cached = llm_cache().get(key)
+        if cached is not None:
+            record_span("llm.stream", started, model=model, retries=0, cache_hit=True)
+            yield cached
+            return
+    retries = 0
+    for attempt in range(max_retries + 1):
+        try:
+            stream = _create_completion(client, model=model, messages=messages, stream=True, **params)
+            break
+        except retryable_errors() as e:
+            if attempt == max_retries:
+                raise
+            retries += 1
+            time.sleep(_retry_delay(e, attempt))
+    first_token = None
+    parts = []
+    for event in stream:
+        if not event.choices:
+            continue
+        delta = event.choices[0].delta.content
+        if delta:
+            if first_token is None:
+                first_token = time.time()
+            parts.append(delta)
+            yield delta
+    content = "".join(parts)
+    record_span("llm.stream", started, model=model, retries=retries, cache_hit=False, chunks=len(parts),
+                time_to_first_token=round((first_token or time.time()) - started, 3))
+    if content and write_cache:
+        llm_cache().set(key, content)
+
+
+def map_chat_completions(client, message_lists, max_workers, on_done=None, **params):
+    """Run one completion per message list concurrently, at most `max_workers` in flight.
+
+    Returns a list in input order where each item is the completion text or the
+    exception that survived all retries. `on_done(index, result)` is called from the
+    calling thread as each request finishes.
+    """
+    results = [None] * len(message_lists)
+    if not message_lists:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(message_lists)))) as pool:
+        futures = {
+            pool.submit(bind(chat_completion), client, messages, **params): idx
+            for idx, messages in enumerate(message_lists)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                results[idx] = future.result()
+            except Exception as e:
+                results[idx] = e
+            if on_done:
+                on_done(idx, results[idx])
+    return results
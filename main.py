@@ -1,25 +1,29 @@
 import streamlit as st
 import os
-import tempfile
-import requests
-import time
-from docx import Document
 from io import BytesIO
-import fitz
-import pytesseract
-from pdf2image import convert_from_bytes
-from PIL import Image
-import subprocess
-import mimetypes
-from moviepy.video.io.VideoFileClip import VideoFileClip
-import streamlit as st
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait
 from env_loader import load_env_keys
+from backends import backend
+from api_client import cancel_remote_extraction, extract_text_remotely, resumable_upload
+from assemblyai_client import cancel_job
+from disk_cache import hash_file
+from extraction import extract_text, is_audio, is_video
+from chunking import CHUNK_TARGET_TOKENS
+from fact_extraction import extract_facts_chunked
+from telemetry import bind, span
+from timing_ui import session_trace, show_timing_panel
 
 # Load all API keys securely
 keys = load_env_keys()
 OPENAI_API_KEY = keys["OPENAI_API_KEY"]
 ASSEMBLYAI_API_KEY = keys["ASSEMBLYAI_API_KEY"]
 
+# Files extracted at once in parallel ingestion mode
+MAX_INGEST_WORKERS = int(os.getenv("MAX_INGEST_WORKERS", "4"))
+# Hand extraction to the upload_api.py job service instead of running it in this process
+USE_JOB_SERVICE = os.getenv("EXONASCOPE_JOB_SERVICE", "") in ("1", "true", "yes")
+
 # Optional validation
 if not ASSEMBLYAI_API_KEY:
     st.error("Please set your ASSEMBLYAI_API_KEY in your .env file.")
@@ -27,31 +31,18 @@ if not ASSEMBLYAI_API_KEY:
 
 # --- Utility Functions ---
 
-def transcribe_with_assemblyai_from_path(filepath):
-    headers = {"authorization": ASSEMBLYAI_API_KEY}
-    with open(filepath, "rb") as f:
-        upload_response = requests.post("https://api.assemblyai.com/v2/upload", headers=headers, files={"file": f})
-    if upload_response.status_code != 200:
-        return f"[Upload Error: {upload_response.text}]"
-    upload_url = upload_response.json()["upload_url"]
-    transcript_response = requests.post("https://api.assemblyai.com/v2/transcript", headers=headers, json={"audio_url": upload_url})
-    if transcript_response.status_code != 200:
-        return f"[Start Error: {transcript_response.text}]"
-    transcript_id = transcript_response.json()["id"]
-    for _ in range(60):
-        poll_response = requests.get(f"https://api.assemblyai.com/v2/transcript/{transcript_id}", headers=headers)
-        status = poll_response.json()["status"]
-        if status == "completed":
-            return poll_response.json()["text"]
-        elif status == "error":
-            return f"[Transcription Error: {poll_response.json()['error']}]"
-        time.sleep(3)
-    return "[Timeout waiting for transcription]"
+def upload_job_key(uploaded_file):
+    return getattr(uploaded_file, "file_id", None) or uploaded_file.name
 
-def has_audio_track(video_path):
-    cmd = ["ffprobe", "-v", "error", "-select_streams", "a", "-show_entries", "stream=index", "-of", "csv=p=0", video_path]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    return result.stdout.strip() != b''
+def upload_digest(uploaded_file):
+    """SHA-256 of an upload, hashed once per file_id rather than on every rerun. Script thread only."""
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id is None:
+        return hash_file(uploaded_file)
+    digests = st.session_state.setdefault("upload_digests", {})
+    if file_id not in digests:
+        digests[file_id] = hash_file(uploaded_file)
+    return digests[file_id]
 
 def show_video_upload():
     st.header("📤 Upload Your Video")
@@ -62,210 +53,144 @@ def show_video_upload():
     # Step 1: File Uploader UI
     video_file = st.file_uploader("Choose a video file to upload", type=["mp4", "mov", "avi", "mkv"])
 
-    # Step 2: Handle Upload to FastAPI server
+    # Step 2: Handle Upload to FastAPI server (resumable, so a dropped connection picks up where it left off)
     if video_file is not None:
-        st.info("Uploading to server...")
+        progress_bar = st.progress(0.0, text="Uploading to server...")
 
         try:
-            files = {"file": (video_file.name, video_file, "video/mp4")}
-
-            # Replace with your actual droplet IP address
-            response = requests.post("http://134.199.196.230:8501", files=files)
+            result = resumable_upload(
+                video_file, video_file.name, video_file.size,
+                on_progress=lambda sent, total: progress_bar.progress(sent / total, text=f"Uploaded {sent} of {total} bytes")
+            )
 
             # Step 3: Show result
-            if response.status_code == 200:
-                st.success("✅ Upload successful!")
-                st.json(response.json())
-            else:
-                st.error(f"❌ Upload failed with status code {response.status_code}")
+            st.success("✅ Upload successful!")
+            st.json(result)
         except Exception as e:
             st.error(f"🚫 Error during upload: {e}")
 
 
 
-def extract_audio_from_video(video_file_path, audio_ext=".wav"):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=audio_ext) as temp_audio:
-        audio_path = temp_audio.name
+def extract_text_from_file(uploaded_file, pdf_mode="hybrid", progress=None, content_hash=None):
+    # Without a progress callback we're on the script thread and can render directly
+    status_line = None
+    on_audio_ready = None
+    if progress is None:
+        status_line = st.empty()
+        progress = status_line.info
+        on_audio_ready = st.audio
     try:
-        with VideoFileClip(video_file_path) as video:
-            if video.audio is None:
-                raise Exception("No audio stream found in the video.")
-            video.audio.write_audiofile(audio_path, codec='pcm_s16le', fps=16000, nbytes=2)
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Audio file not found: {audio_path}")
-        return audio_path
-    except Exception as e:
-        return f"[Audio extraction failed: {e}]"
-
-def fallback_extract_with_ffmpeg(video_file_path, output_audio_path):
-    command = ["ffmpeg", "-y", "-i", video_file_path, "-vn", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", output_audio_path]
-    try:
-        subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return output_audio_path
-    except subprocess.CalledProcessError as e:
-        return f"[FFmpeg fallback failed: {e.stderr.decode()}]"
-
-def reencode_audio_to_pcm_wav(input_path):
-    reencoded_path = input_path.replace(".wav", "_fixed.wav")
-    command = ["ffmpeg", "-y", "-i", input_path, "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", reencoded_path]
+        if USE_JOB_SERVICE:
+            return extract_text_remotely(uploaded_file, uploaded_file.name, uploaded_file.type, pdf_mode=pdf_mode,
+                                         key=upload_job_key(uploaded_file), progress=progress,
+                                         content_hash=content_hash)
+        return extract_text(uploaded_file, uploaded_file.name, uploaded_file.type, ASSEMBLYAI_API_KEY,
+                            pdf_mode=pdf_mode, job_key=upload_job_key(uploaded_file),
+                            progress=progress, on_audio_ready=on_audio_ready, content_hash=content_hash)
+    finally:
+        if status_line is not None:
+            status_line.empty()
+
+def extract_files_concurrently(files, max_workers=MAX_INGEST_WORKERS):
+    """Extract files on a thread pool with live per-file progress; results (or exceptions) come back in upload order."""
+    placeholders = [st.empty() for _ in files]
+    updates = queue.Queue()
+    results = [None] * len(files)
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(files)))
     try:
-        subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return reencoded_path
-    except subprocess.CalledProcessError as e:
-        return f"[Re-encode failed: {e.stderr.decode()}]"
-
-def convert_wav_to_mp3(input_path):
-    mp3_path = input_path.replace(".wav", ".mp3")
-    command = ["ffmpeg", "-y", "-i", input_path, "-acodec", "libmp3lame", "-ar", "16000", "-ac", "1", mp3_path]
-    try:
-        subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return mp3_path
-    except subprocess.CalledProcessError as e:
-        return f"[MP3 conversion failed: {e.stderr.decode()}]"
-
-def parse_pdf_text(file):
-    file.seek(0)
-    doc = fitz.open(stream=file.read(), filetype="pdf")
-    return "\n".join([page.get_text() for page in doc if page.get_text()])
-
-def run_ocr_on_pdf(file):
-    file.seek(0)
-    images = convert_from_bytes(file.read(), dpi=300)
-    text = ""
-    for img in images:
-        text += pytesseract.image_to_string(img, config="--psm 6")
-    return text
-
-def parse_docx(file):
-    return "\n".join([p.text for p in Document(file).paragraphs])
-
-def extract_text_from_file(uploaded_file):
-    parsed = ""
-    temp_paths = []
-    if uploaded_file.type.startswith("video/") or uploaded_file.name.lower().endswith((".mp4", ".avi", ".mkv", ".mov")):
-        st.info("Extracting audio from video...")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-            video_bytes = uploaded_file.read()
-            temp_video.write(video_bytes)
-            temp_video.flush()
-            os.fsync(temp_video.fileno())
-            temp_video_path = temp_video.name
-            temp_paths.append(temp_video_path)
-
-        if not has_audio_track(temp_video_path):
-            return "[Error: No audio stream detected.]"
-
-        audio_path = extract_audio_from_video(temp_video_path)
-        if isinstance(audio_path, str) and audio_path.startswith("[Audio extraction failed"):
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_fallback:
-                fallback_path = temp_fallback.name
-            audio_path = fallback_extract_with_ffmpeg(temp_video_path, fallback_path)
-            temp_paths.append(fallback_path)
-        temp_paths.append(audio_path)
-
-        if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
-            return "[Transcription Error: Extracted audio file is missing or empty.]"
-
-        fixed_wav_path = reencode_audio_to_pcm_wav(audio_path)
-        mp3_path = convert_wav_to_mp3(fixed_wav_path)
-        temp_paths.extend([fixed_wav_path, mp3_path])
-
-        mime, _ = mimetypes.guess_type(mp3_path)
-        st.audio(mp3_path)
-        st.write(f"🧪 Uploading: {mp3_path} | MIME: {mime} | Size: {os.path.getsize(mp3_path)} bytes")
-
-        st.info("Transcribing re-encoded MP3 audio...")
-        parsed = transcribe_with_assemblyai_from_path(mp3_path)
-
-        for path in temp_paths:
-            if os.path.exists(path):
-                os.remove(path)
-
-    elif "pdf" in uploaded_file.type:
-        parsed = parse_pdf_text(uploaded_file)
-        if not parsed.strip():
-            st.info("No embedded text, running OCR...")
-            parsed = run_ocr_on_pdf(uploaded_file)
-    elif "word" in uploaded_file.type or uploaded_file.name.endswith(".docx"):
-        parsed = parse_docx(uploaded_file)
-    elif "audio" in uploaded_file.type or uploaded_file.type.startswith("audio/"):
-        uploaded_file.seek(0)
-        ext = os.path.splitext(uploaded_file.name)[1].lower()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            tmp.write(uploaded_file.read())
-            tmp.flush()
-            tmp_path = tmp.name
-        with st.spinner("Transcribing audio..."):
-            parsed = transcribe_with_assemblyai_from_path(tmp_path)
-        os.remove(tmp_path)
-    else:
-        parsed = "[Unsupported file type]"
-    return parsed
+        futures = {
+            pool.submit(bind(extract_text_from_file), f, progress=lambda msg, i=idx: updates.put((i, msg)),
+                        content_hash=upload_digest(f)): idx
+            for idx, f in enumerate(files)
+        }
+        for idx, f in enumerate(files):
+            placeholders[idx].info(f"{f.name}: queued")
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.25)
+            while not updates.empty():
+                idx, message = updates.get_nowait()
+                if results[idx] is None:
+                    placeholders[idx].info(f"{files[idx].name}: {message}")
+            for future in done:
+                idx = futures[future]
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    results[idx] = e
+                placeholders[idx].empty()
+    finally:
+        # Don't block a Streamlit rerun on in-flight work. Workers left running finish
+        # on their own; a rerun on the same file reattaches to them in extract_text
+        # rather than uploading and transcribing it again.
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
 
 def save_docx(text, filename="output.docx"):
     docx_file = BytesIO()
-    doc = Document()
+    doc = backend("docx").Document()
     doc.add_paragraph(text)
     doc.save(docx_file)
     docx_file.seek(0)
     return docx_file
 
-def extract_facts_with_gpt_chunked(full_text, case_name, case_number, chunk_size=4000):
-    if not OPENAI_API_KEY:
-        return "[OpenAI API key not set. Cannot extract facts.]"
-    import openai
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-    chunks = [full_text[i:i+chunk_size] for i in range(0, len(full_text), chunk_size)]
-    all_facts = []
-    for idx, chunk in enumerate(chunks):
-        prompt = f"""Using only the exact facts from the following material — without combining, summarizing, or paraphrasing — extract every individual event and action exactly as written, in strict chronological order.
+def extract_facts_with_gpt_chunked(segments, case_name, case_number, max_tokens=CHUNK_TARGET_TOKENS):
+    progress_bar = st.progress(0.0, text="Extracting facts...")
 
-CASE NAME: {case_name}
-CASE NUMBER: {case_number}
-SOURCE MATERIAL (PART {idx+1} of {len(chunks)}):
+    def show_progress(completed, total):
+        progress_bar.progress(completed / total, text=f"Extracted facts from {completed} of {total} chunks")
 
-{chunk}
-"""
-        with st.spinner(f"Extracting facts from chunk {idx+1} of {len(chunks)}..."):
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You extract and present only the original facts in strict chronological order for legal suppression review. Do not enhance."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.0
-                )
-                facts = response.choices[0].message.content.strip()
-                all_facts.append(facts)
-            except Exception as e:
-                all_facts.append(f"[GPT Error in chunk {idx+1}: {e}]")
-    return "\n\n".join(all_facts)
+    facts, failed_chunks = extract_facts_chunked(segments, case_name, case_number, OPENAI_API_KEY,
+                                                 max_tokens=max_tokens, on_chunk_done=show_progress)
+    progress_bar.empty()
+    return facts, failed_chunks
 
 # --- UI ---
 st.title("ExonaScope Phase 1 – Upload, Transcribe, Extract Facts")
 case_name = st.text_input("Case Name")
 case_number = st.text_input("Case Number")
+trace = session_trace(case_number or case_name)
 uploaded_files = st.file_uploader(
     "Upload PDFs, DOCX, audio, or video files",
     type=["pdf", "docx", "mp3", "wav", "m4a", "mp4", "avi", "mkv", "mov"],
     accept_multiple_files=True
 )
 
+# Cancel transcriptions for files the user removed since the last run
+current_job_keys = {upload_job_key(f) for f in uploaded_files or []}
+for removed_key in st.session_state.get("transcription_job_keys", set()) - current_job_keys:
+    cancel_job(removed_key, ASSEMBLYAI_API_KEY)
+    cancel_remote_extraction(removed_key)
+st.session_state["transcription_job_keys"] = current_job_keys
+st.session_state["upload_digests"] = {
+    file_id: digest for file_id, digest in st.session_state.get("upload_digests", {}).items()
+    if file_id in current_job_keys
+}
+
+parallel_ingest = st.checkbox("Process files in parallel", value=True, key="parallel_ingest")
+
 parsed_segments = []
 if uploaded_files:
     st.subheader("📄 Parsed Preview")
+    if parallel_ingest and len(uploaded_files) > 1:
+        with span("phase1.ingest", files=len(uploaded_files), parallel=True):
+            extracted = extract_files_concurrently(uploaded_files)
+    else:
+        extracted = [None] * len(uploaded_files)
     for idx, uploaded_file in enumerate(uploaded_files):
         st.write(f"**File:** {uploaded_file.name}")
         try:
-            parsed = extract_text_from_file(uploaded_file)
+            parsed = extracted[idx]
+            if isinstance(parsed, Exception):
+                raise parsed
+            if parsed is None:
+                parsed = extract_text_from_file(uploaded_file, content_hash=upload_digest(uploaded_file))
             if parsed.strip():
                 parsed_segments.append(f"[{uploaded_file.name}]\n{parsed}")
                 with st.expander(f"Preview: {uploaded_file.name}"):
                     st.text(parsed[:2000])
                 if (
-                    ("audio" in uploaded_file.type or uploaded_file.type.startswith("audio/")) or
-                    (uploaded_file.type.startswith("video/") or uploaded_file.name.lower().endswith((".mp4", ".avi", ".mkv", ".mov")))
+                    is_audio(uploaded_file.name, uploaded_file.type) or is_video(uploaded_file.name, uploaded_file.type)
                 ) and not parsed.startswith("["):
                     docx_file = save_docx(parsed, filename=f"{uploaded_file.name}_transcript.docx")
                     st.download_button(
@@ -282,10 +207,13 @@ if uploaded_files:
 # --- Fact Extraction and Editing ---
 if parsed_segments:
     if st.button("🧠 Generate Chronological Facts (GPT-4o)", key="generate_facts"):
-        full_text = "\n\n".join(parsed_segments)
-        facts = extract_facts_with_gpt_chunked(full_text, case_name, case_number, chunk_size=4000)
+        with span("phase1.facts", sources=len(parsed_segments)):
+            facts, failed_chunks = extract_facts_with_gpt_chunked(parsed_segments, case_name, case_number)
         if facts and not facts.startswith("["):
             st.success("Fact extraction complete!")
+            if failed_chunks:
+                st.warning(f"⚠️ Facts from part(s) {', '.join(map(str, failed_chunks))} of the source material "
+                           "could not be extracted and are missing. Generate again to retry them.")
             st.session_state["phase2_facts"] = facts
         else:
             st.error(facts)
@@ -315,8 +243,8 @@ if st.button("Continue to Legal Analysis in Phase 2", key="continue_phase2"):
     st.session_state["phase2_facts"] = st.session_state.get("phase2_facts", "")
     st.switch_page("pages/ExonaScope_Phase2.py")  # Use the correct path to your Phase 2 script
 
-# --- Debugging: Show Session State ---
-if st.checkbox("Show Session State (Debug)", key="show_session_state"):
-    st.write(dict(st.session_state))
+# --- Timing Waterfall ---
+if st.checkbox("Show Timing Waterfall", key="show_timing"):
+    show_timing_panel(trace)
 
 
@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from backends import backend
+
+OCR_DPI = 300
+OCR_CONFIG = "--psm 6"
+
+# A page whose text layer is shorter than this is treated as image-only
+MIN_TEXT_CHARS = 25
+# A page mostly covered by images with only a sparse text layer (e.g. a stamped
+# caption on a scanned exhibit) is also sent to OCR
+IMAGE_COVERAGE_THRESHOLD = 0.6
+SPARSE_TEXT_CHARS = 200
+
+# OCR workers start from a fresh server process rather than a fork of the app,
+# which runs other threads (Streamlit sessions, API jobs) that may hold locks
+OCR_MP_CONTEXT = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _init_worker():
+    # One tesseract thread per process; the pool already spreads work across cores
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_page(pdf_path, page_number, dpi=OCR_DPI, config=OCR_CONFIG):
+    """Render one page and OCR it, so only a single rendered page lives in each worker."""
+    pytesseract = backend("pytesseract")
+    images = backend("pdf2image").convert_from_path(pdf_path,
+                                                    dpi=dpi,
+                                                    first_page=page_number,
+                                                    last_page=page_number)
+    try:
+        return "".join(
+            pytesseract.image_to_string(img, config=config) for img in images)
+    finally:
+        for img in images:
+            img.close()
+
+
+def pdf_page_count(pdf_path):
+    return int(backend("pdf2image").pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def default_ocr_workers():
+    return max(1, os.cpu_count() or 1)
+
+
+def iter_ocr_pdf_pages(pdf_path, page_numbers=None, workers=None,
+                       dpi=OCR_DPI):
+    """Yield (page_number, text) in page order, OCR'ing pages across a process pool.
+
+    Pages are rendered one at a time inside the workers, so at most `workers`
+    rendered pages are held in memory at once regardless of document length.
+    """
+    if page_numbers is None:
+        page_numbers = range(1, pdf_page_count(pdf_path) + 1)
+    page_numbers = list(page_numbers)
+    if not page_numbers:
+        return
+    workers = min(workers or default_ocr_workers(), len(page_numbers))
+
+    if workers == 1:
+        for page_number in page_numbers:
+            yield page_number, _ocr_page(pdf_path, page_number, dpi)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context(OCR_MP_CONTEXT),
+                             initializer=_init_worker) as pool:
+        texts = pool.map(_ocr_page, [pdf_path] * len(page_numbers), page_numbers, [dpi] * len(page_numbers))
+        for page_number, text in zip(page_numbers, texts):
+            yield page_number, text
+
+
+def ocr_pdf_pages(pdf_path, page_numbers=None, workers=None, dpi=OCR_DPI):
+    """OCR the given 1-based pages of a PDF on disk, returning {page_number: text}."""
+    return dict(iter_ocr_pdf_pages(pdf_path, page_numbers, workers, dpi))
+
+
+def page_image_coverage(page):
+    """Fraction of the page area covered by placed images (overlaps counted once per image, capped at 1)."""
+    page_area = abs(page.rect)
+    if not page_area:
+        return 0.0
+    fitz = backend("fitz")
+    covered = 0.0
+    for info in page.get_image_info():
+        covered += abs(fitz.Rect(info["bbox"]) & page.rect)
+    return min(covered / page_area, 1.0)
+
+
+def page_needs_ocr(page, text):
+    chars = len(text.strip())
+    if chars < MIN_TEXT_CHARS:
+        return True
+    return chars < SPARSE_TEXT_CHARS and page_image_coverage(
+        page) >= IMAGE_COVERAGE_THRESHOLD
+
+
+def extract_pdf_text_hybrid(pdf_path, workers=None, dpi=OCR_DPI):
+    """Take the text layer where it exists and OCR only the image-only pages.
+
+    Returns (text, ocr_page_numbers) with pages kept in document order.
+    """
+    page_texts = {}
+    ocr_pages = []
+    with backend("fitz").open(pdf_path) as doc:
+        for page in doc:
+            text = page.get_text()
+            page_number = page.number + 1
+            if page_needs_ocr(page, text):
+                ocr_pages.append(page_number)
+            else:
+                page_texts[page_number] = text
+        page_count = doc.page_count
+    if ocr_pages:
+        page_texts.update(ocr_pdf_pages(pdf_path, ocr_pages, workers, dpi))
+    text = "\n".join(page_texts[n] for n in range(1, page_count + 1)
+                     if page_texts[n].strip())
+    return text, ocr_pages
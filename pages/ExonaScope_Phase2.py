@@ -1,85 +1,39 @@
 import streamlit as st
-import json
 import os
-import ast
-import re
+from legal_analysis import (generate_defenses, generate_suppression_issues, legal_assistant_messages,
+                            summarize_facts_for_motion)
+from llm_client import chat_completion, make_client, stream_chat_completion
+from telemetry import span
+from timing_ui import session_trace, show_timing_panel
 
 # --- GPT Call Utility ---
-def gpt_call(prompt):
+def gpt_call(prompt, placeholder=None):
+    """Run a prompt; with a placeholder, tokens are rendered into it as they arrive."""
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         st.error("OPENAI_API_KEY is not set in your environment variables.")
         st.stop()
-    from openai import OpenAI
-    client = OpenAI(api_key=api_key)
+    client = make_client(api_key)
+    messages = legal_assistant_messages(prompt)
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a precise, formal legal assistant."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        if not response or not hasattr(response, "choices") or not response.choices:
+        if placeholder is None:
+            result = chat_completion(client, messages, use_cache=True)
+        else:
+            result = ""
+            for delta in stream_chat_completion(client, messages, use_cache=True):
+                result += delta
+                placeholder.markdown(result + " ▌")
+            placeholder.empty()
+        if not result:
             st.error("No response from AI. Check API key or network.")
             return ""
-        return response.choices[0].message.content.strip()
+        return result.strip()
     except Exception as e:
         st.error(f"OpenAI call failed: {e}")
         return ""
 
-def parse_ai_output(result):
-    result = result.strip()
-    if result.startswith("```"):
-        result = re.sub(r"^```(?:json)?\n?", "", result, flags=re.IGNORECASE)
-        result = re.sub(r"\n?```$", "", result)
-    try:
-        return json.loads(result)
-    except Exception:
-        try:
-            return ast.literal_eval(result)
-        except Exception:
-            return []
-
-def generate_suppression_issues(facts, tags):
-    prompt = f"""
-You are a criminal defense attorney. Based on the following raw facts and tagged events, list plausible suppression issues related to constitutional violations.
-
-For each issue, return:
-- "title" (e.g., "Unlawful Search and Seizure")
-- "explanation" (1–2 sentence summary, referencing the facts)
-
-Facts:
-{facts}
-
-Tagged Events:
-{tags}
-
-Return a JSON list of objects with "title" and "explanation".
-"""
-    result = gpt_call(prompt)
-    issues = parse_ai_output(result)
-    return [i for i in issues if "title" in i and "explanation" in i]
-
-def generate_defenses(facts, tags):
-    prompt = f"""
-You are a criminal defense strategist. Based on the facts and tagged legal events, identify all non-suppression legal defenses.
-
-For each defense:
-- "title" (e.g., "Mistaken Identity", "Alibi")
-- "explanation" (2–3 sentence reasoning)
-
-Facts:
-{facts}
-
-Tagged Events:
-{tags}
-
-Return a JSON list formatted with "title" and "explanation" for each defense.
-"""
-    result = gpt_call(prompt)
-    defenses = parse_ai_output(result)
-    return [d for d in defenses if "title" in d and "explanation" in d]
+def streaming_gpt_call(placeholder):
+    return lambda prompt: gpt_call(prompt, placeholder)
 
 # ----------------- UI Starts -----------------
 st.title("ExonaScope Phase 2 – Auto-Generated Legal Strategy")
@@ -99,16 +53,17 @@ st.session_state["case_name"] = case_name
 st.session_state["case_number"] = case_number
 st.session_state["phase2_facts"] = facts
 st.session_state["phase2_tags"] = tags
+trace = session_trace(case_number or case_name)
 
 # ----------------- AUTO-GENERATE -----------------
 if facts.strip():
     if "phase2_issues" not in st.session_state or not st.session_state["phase2_issues"]:
-        with st.spinner("Auto-generating suppression issues..."):
-            st.session_state["phase2_issues"] = generate_suppression_issues(facts, tags)
+        with st.spinner("Auto-generating suppression issues..."), span("phase2.issues"):
+            st.session_state["phase2_issues"] = generate_suppression_issues(facts, tags, gpt=streaming_gpt_call(st.empty()))
 
     if "phase2_defenses" not in st.session_state or not st.session_state["phase2_defenses"]:
-        with st.spinner("Auto-generating potential defenses..."):
-            st.session_state["phase2_defenses"] = generate_defenses(facts, tags)
+        with st.spinner("Auto-generating potential defenses..."), span("phase2.defenses"):
+            st.session_state["phase2_defenses"] = generate_defenses(facts, tags, gpt=streaming_gpt_call(st.empty()))
 
 # ----------------- DISPLAY RESULTS -----------------
 st.subheader("📑 AI-Generated Suppression Issues")
@@ -128,23 +83,9 @@ else:
     st.info("No defenses generated yet.")
 
 # ----------------- Summarize Facts -----------------
-def summarize_facts_for_motion(raw_facts, tagged_events):
-    prompt = f"""
-You are a legal writing assistant. Given the facts and tagged legal events below, write a clear and neutral 'Statement of Facts' for a legal motion. Be chronological and professional.
-
-Facts:
-{raw_facts}
-
-Tagged Events:
-{tagged_events}
-
-Return a formal narrative paragraph.
-"""
-    return gpt_call(prompt)
-
 if st.button("📝 Summarize Facts for Motion", key="summarize_facts"):
-    with st.spinner("Drafting summary..."):
-        summary = summarize_facts_for_motion(facts, tags)
+    with st.spinner("Drafting summary..."), span("phase2.summarize"):
+        summary = summarize_facts_for_motion(facts, tags, gpt=streaming_gpt_call(st.empty()))
     st.session_state["motion_facts"] = summary
 
 if "motion_facts" in st.session_state:
@@ -160,7 +101,7 @@ if "motion_facts" in st.session_state:
         st.switch_page("pages/ExonaScope_Phase3.py")  # Adjust as needed
 
 
-# Debug Output
-if st.checkbox("🪵 Debug Session State"):
-    st.json(dict(st.session_state))
+# Timing Waterfall
+if st.checkbox("⏱️ Show Timing Waterfall"):
+    show_timing_panel(trace)
 
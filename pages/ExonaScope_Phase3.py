@@ -1,18 +1,9 @@
-from docx.shared import RGBColor
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
 import streamlit as st
-import requests
-import os
 from datetime import date
-from io import BytesIO
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT, WD_LINE_SPACING
-from fpdf import FPDF
-from openai import OpenAI
-import hashlib
-import re  # For cleaning memo sections
+from case_memo import (JURIS_LIST, build_memo, build_memo_sections, memo_docx_bytes, memo_html,
+                       memo_pdf_bytes, section_html)
+from telemetry import span
+from timing_ui import session_trace, show_timing_panel
 
 FONT_PATH = "fonts/Century-Schoolbook-Normal.ttf"
 
@@ -33,424 +24,6 @@ b { font-weight: 700 !important; }
 """,
             unsafe_allow_html=True)
 
-# ---- Jurisdictions ----
-JURIS_LIST = [
-    # ...[as before, full list of states/territories/federal appellate circuits]...
-    ("Alabama", "alabama"),
-    ("Alaska", "alaska"),
-    ("Arizona", "arizona"),
-    ("Arkansas", "arkansas"),
-    ("California", "california"),
-    ("Colorado", "colorado"),
-    ("Connecticut", "connecticut"),
-    ("Delaware", "delaware"),
-    ("District of Columbia", "dc"),
-    ("Florida", "florida"),
-    ("Georgia", "georgia"),
-    ("Hawaii", "hawaii"),
-    ("Idaho", "idaho"),
-    ("Illinois", "illinois"),
-    ("Indiana", "indiana"),
-    ("Iowa", "iowa"),
-    ("Kansas", "kansas"),
-    ("Kentucky", "kentucky"),
-    ("Louisiana", "louisiana"),
-    ("Maine", "maine"),
-    ("Maryland", "maryland"),
-    ("Massachusetts", "massachusetts"),
-    ("Michigan", "michigan"),
-    ("Minnesota", "minnesota"),
-    ("Mississippi", "mississippi"),
-    ("Missouri", "missouri"),
-    ("Montana", "montana"),
-    ("Nebraska", "nebraska"),
-    ("Nevada", "nevada"),
-    ("New Hampshire", "new_hampshire"),
-    ("New Jersey", "new_jersey"),
-    ("New Mexico", "new_mexico"),
-    ("New York", "new_york"),
-    ("North Carolina", "north_carolina"),
-    ("North Dakota", "north_dakota"),
-    ("Ohio", "ohio"),
-    ("Oklahoma", "oklahoma"),
-    ("Oregon", "oregon"),
-    ("Pennsylvania", "pennsylvania"),
-    ("Puerto Rico", "pr"),
-    ("Rhode Island", "rhode_island"),
-    ("South Carolina", "south_carolina"),
-    ("South Dakota", "south_dakota"),
-    ("Tennessee", "tennessee"),
-    ("Texas", "texas"),
-    ("Utah", "utah"),
-    ("Vermont", "vermont"),
-    ("Virginia", "virginia"),
-    ("Washington", "washington"),
-    ("West Virginia", "west_virginia"),
-    ("Wisconsin", "wisconsin"),
-    ("Wyoming", "wyoming"),
-    ("American Samoa", "as"),
-    ("Guam", "gu"),
-    ("Northern Mariana Islands", "mp"),
-    ("Virgin Islands", "vi"),
-    ("Supreme Court of the United States", "scotus"),
-    ("1st Cir. Court of Appeals", "ca1"),
-    ("2nd Cir. Court of Appeals", "ca2"),
-    ("3rd Cir. Court of Appeals", "ca3"),
-    ("4th Cir. Court of Appeals", "ca4"),
-    ("5th Cir. Court of Appeals", "ca5"),
-    ("6th Cir. Court of Appeals", "ca6"),
-    ("7th Cir. Court of Appeals", "ca7"),
-    ("8th Cir. Court of Appeals", "ca8"),
-    ("9th Cir. Court of Appeals", "ca9"),
-    ("10th Cir. Court of Appeals", "ca10"),
-    ("11th Cir. Court of Appeals", "ca11"),
-    ("D.C. Circuit", "cadc"),
-    ("Federal Circuit", "cafc"),
-]
-
-
-def bluebook_citation(case):
-    if not case.get("case_name") or not case.get("citation"): return ""
-    citation = f"*{case['case_name']}*, {case['citation']} ({case['court']} {case['date'][:4]})"
-    if case.get("url"): return f"[{citation}]({case['url']})"
-    return citation
-
-
-def bluebook_citation_docx(case):
-    if not case.get("case_name") or not case.get("citation"): return ""
-    return f"{case['case_name']}, {case['citation']} ({case['court']} {case['date'][:4]})"
-
-
-def dedup_citations(cases):
-    unique = {}
-    for c in cases:
-        key = (c.get("citation", ""), c.get("court", ""))
-        if key not in unique and c.get("case_name"):
-            unique[key] = c
-    return list(unique.values())
-
-
-def clean_unicode(text):
-    """Replace problematic Unicode characters with ASCII equivalents for PDF export."""
-    replacements = {
-        '\u2013': '-',  # en-dash
-        '\u2014': '--',  # em-dash
-        '\u2018': "'",  # left single quote
-        '\u2019': "'",  # right single quote (your current error)
-        '\u201c': '"',  # left double quote
-        '\u201d': '"',  # right double quote
-        # Add further replacements here if needed
-    }
-    for uni_char, ascii_char in replacements.items():
-        text = text.replace(uni_char, ascii_char)
-    return text
-
-
-def fetch_caselaw_from_courtlistener(arg,
-                                     jurisdictions,
-                                     limit=4,
-                                     appellate_only=False):
-    """Get up-to-4 caselaw hits per jurisdiction (deduped)."""
-    results = []
-    for juris_code in jurisdictions:
-        params = {
-            "q": arg,
-            "type": "o",
-            "page_size": limit,
-            "order_by": "-date_filed",
-            "jurisdiction": juris_code,
-        }
-        if appellate_only:
-            params[
-                "court_type"] = "A"  # "A" for appellate courts; omit for all
-        params = {k: v for k, v in params.items() if v is not None}
-        try:
-            r = requests.get(
-                "https://www.courtlistener.com/api/rest/v3/search/",
-                params=params,
-                timeout=10)
-            if r.status_code == 200:
-                for item in r.json().get("results", []):
-                    case_name = item.get("caseName") or item.get(
-                        "case_name") or ""
-                    citation = item.get("citation", "")
-                    court = item.get("court", {}).get("name", "")
-                    date_val = item.get("dateFiled",
-                                        item.get("date_filed", ""))
-                    url = item.get("absolute_url", "")
-                    summary = item.get("plain_text", "")
-                    if summary:
-                        summary = summary[:350].replace(
-                            "\n", " ") + ("..." if len(summary) > 340 else "")
-                    results.append({
-                        "case_name":
-                        case_name,
-                        "citation":
-                        citation,
-                        "court":
-                        court,
-                        "date":
-                        date_val,
-                        "url":
-                        f"https://www.courtlistener.com{url}" if url else "",
-                        "summary":
-                        summary
-                    })
-        except Exception:
-            pass
-    return dedup_citations(results)
-
-
-def gpt_argument_and_rebuttal(section_title,
-                              arg,
-                              facts,
-                              jurisdiction_str,
-                              caselaw_md,
-                              is_suppression=True):
-    api_key = os.getenv("OPENAI_API_KEY")
-
-    what = 'suppression issue' if is_suppression else 'defense theory'
-    prompt = f"""You are an experienced criminal defense attorney. For a confidential internal memorandum, draft a clear, highly professional legal argument for:
-    {what.title()}: {section_title}
-    Jurisdictions: {jurisdiction_str}
-    Facts: {facts}
-    Argument/Explanation: {arg}
-    Supporting Caselaw:
-    {caselaw_md}
-
-    Cite using Bluebook format (name, citation, year), and then write a short 'Counterarguments and Rebuttal' section that anticipates and responds to how the prosecution will likely attack this argument. Use real cited cases in both main argument and the rebuttal if possible. Label each section clearly. 
-    Write the section as if it is part of a professional legal memorandum being submitted to court.
-    Do NOT include boilerplate headers such as 'To:', 'From:', 'Date:', or 'Subject:'.
-    Use the section title (e.g., 'Unlawful Arrest Without Probable Cause') as a bold or styled heading.
-    Begin directly with the legal argument and reasoning.
-    """
-    # Call the API and return the response text.
-    client = OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{
-            "role":
-            "system",
-            "content":
-            "You are a skilled criminal defense legal memo writer."
-        }, {
-            "role": "user",
-            "content": prompt
-        }])
-    return response.choices[0].message.content
-
-
-def clean_memo_section(text):
-    # Remove any remaining boilerplate lines if GPT still returns them
-    patterns_to_remove = [
-        r"(?i)^To:.*$",
-        r"(?i)^From:.*$",
-        r"(?i)^Date:.*$",
-        r"(?i)^Subject:.*$",
-        r"(?i)^Argument:.*$",  # Remove "Argument: XYZ" headers
-    ]
-    for pattern in patterns_to_remove:
-        text = re.sub(pattern, "", text, flags=re.MULTILINE)
-    return text.strip()
-
-
-def build_case_analysis_memo_docx(title, defendant, case_num, date_str, facts,
-                                  suppression_issues, defense_sections):
-    doc = Document()
-    section = doc.sections[0]
-    section.left_margin = section.right_margin = Pt(72)
-    section.top_margin = section.bottom_margin = Pt(72)
-
-    # === Add Header ===
-    header = section.header
-    header_para = header.paragraphs[0]
-    header_para.text = f"{title}    Case #: {case_num}    Date: {date_str}"
-    header_para.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-    run = header_para.runs[0]
-    run.font.size = Pt(11)
-    run.font.name = "Century Schoolbook"
-    run.bold = True
-
-    # === Add Footer with Page Number + Disclaimer ===
-    footer = section.footer
-    para = footer.paragraphs[0]
-    para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-    run = para.add_run("Page ")
-    fldChar1 = OxmlElement('w:fldChar')
-    fldChar1.set(qn('w:fldCharType'), 'begin')
-    instrText = OxmlElement('w:instrText')
-    instrText.text = "PAGE"
-    fldChar2 = OxmlElement('w:fldChar')
-    fldChar2.set(qn('w:fldCharType'), 'end')
-    run._r.append(fldChar1)
-    run._r.append(instrText)
-    run._r.append(fldChar2)
-    run.font.name = "Century Schoolbook"
-    run.font.size = Pt(9)
-
-    disclaimer = footer.add_paragraph()
-    disclaimer.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-    disc_run = disclaimer.add_run(
-        "This memorandum is for internal defense team review only.\nATTORNEY–CLIENT PRIVILEGED / WORK PRODUCT"
-    )
-    disc_run.font.color.rgb = RGBColor(128, 128, 128)
-    disc_run.italic = True
-    disc_run.font.name = "Century Schoolbook"
-    disc_run.font.size = Pt(9)
-
-    # === Main Title ===
-    p = doc.add_paragraph("CASE ANALYSIS MEMORANDUM")
-    p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-    p.runs[0].font.size = Pt(16)
-    p.runs[0].font.name = "Century Schoolbook"
-    p.runs[0].bold = True
-    p.paragraph_format.space_after = Pt(24)
-
-    # === Body Sections ===
-    def add_body_heading(text):
-        para = doc.add_paragraph(text)
-        para.runs[0].bold = True
-        para.paragraph_format.space_after = Pt(12)
-
-    def add_justified(text):
-        para = doc.add_paragraph(text)
-        para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-        para.paragraph_format.first_line_indent = Pt(24)
-        para.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
-        para.paragraph_format.space_after = Pt(12)
-
-    add_body_heading("SUMMARY OF PERTINENT FACTS")
-    add_justified(facts)
-
-    add_body_heading("A. SUPPRESSION ISSUES")
-    for idx, s in enumerate(suppression_issues, 1):
-        doc.add_paragraph(f"{idx}. {s['title']}").runs[0].bold = True
-        add_justified(s['argument'])
-        para = doc.add_paragraph("Supporting Caselaw:")
-        para.runs[0].bold = True
-        if s['cases']:
-            for case in s['cases']:
-                txt = bluebook_citation_docx(case)
-                if case.get('summary'): txt += f" — {case['summary']}"
-                doc.add_paragraph(txt, style='List Bullet')
-        else:
-            doc.add_paragraph("No relevant caselaw found.",
-                              style='List Bullet')
-        para = doc.add_paragraph("Counterarguments and Rebuttal:")
-        para.runs[0].bold = True
-        add_justified(s.get('rebuttal', ''))
-
-    add_body_heading("B. POTENTIAL DEFENSES")
-    for idx, d in enumerate(defense_sections, 1):
-        doc.add_paragraph(f"{idx}. {d['title']}").runs[0].bold = True
-        add_justified(d['argument'])
-        para = doc.add_paragraph("Supporting Caselaw:")
-        para.runs[0].bold = True
-        if d['cases']:
-            for case in d['cases']:
-                txt = bluebook_citation_docx(case)
-                if case.get('summary'): txt += f" — {case['summary']}"
-                doc.add_paragraph(txt, style='List Bullet')
-        else:
-            doc.add_paragraph("No relevant caselaw found.",
-                              style='List Bullet')
-        para = doc.add_paragraph("Counterarguments and Rebuttal:")
-        para.runs[0].bold = True
-        add_justified(d.get('rebuttal', ''))
-
-    doc.add_paragraph("CONCLUSION").runs[0].bold = True
-    doc.add_paragraph(
-        "This memorandum is for internal defense team review only and is not intended for filing without attorney revision."
-    )
-
-    # Final font styling
-    for p in doc.paragraphs:
-        for r in p.runs:
-            r.font.name = "Century Schoolbook"
-            r.font.size = Pt(12)
-    return doc
-
-
-class CaseMemoPDF(FPDF):
-
-    def __init__(self, case_title, case_number, memo_date):
-        super().__init__()
-        self.case_title = case_title
-        self.case_number = case_number
-        self.memo_date = memo_date
-        self.set_auto_page_break(auto=True, margin=20)
-        self.alias_nb_pages()
-
-    def header(self):
-        self.set_font("Arial", "B", 11)
-        self.set_text_color(0)
-        self.cell(
-            0,
-            8,
-            f"{self.case_title}    Case #: {self.case_number}    Date: {self.memo_date}",
-            ln=1,
-            align="L")
-        self.ln(2)
-
-    def footer(self):
-        self.set_y(-20)
-        self.set_font("Arial", "", 9)
-        self.set_text_color(0)
-        self.cell(0, 6, f"Page {self.page_no()} of {{nb}}", align="C", ln=1)
-        self.set_text_color(128)
-        self.set_font("Arial", "I", 8)
-        self.multi_cell(
-            0,
-            4,
-            "This memorandum is for internal defense team review only.\nATTORNEY–CLIENT PRIVILEGED / WORK PRODUCT",
-            align="C")
-
-
-def convert_docx_to_pdf_rich(docx_path, pdf_path, case_title, case_number,
-                             memo_date):
-    doc = Document(docx_path)
-    pdf = CaseMemoPDF(case_title, case_number, memo_date)
-    pdf.add_page()
-    pdf.set_left_margin(20)
-    pdf.set_right_margin(20)
-
-    for para in doc.paragraphs:
-        style = para.style.name.lower()
-        text = clean_unicode(para.text.strip())
-
-        if not text:
-            pdf.ln(3)
-            continue
-
-        if style.startswith("heading") or text.isupper():
-            pdf.set_font("Arial", "B", 12)
-            pdf.set_text_color(0)
-            pdf.ln(4)
-            pdf.multi_cell(0, 8, text.upper())
-            pdf.ln(1)
-        elif any(text.lower().startswith(label) for label in [
-                "type of violation", "legal standard", "supporting evidence",
-                "explanation", "argument", "case law", "defense",
-                "counter argument", "rebuttal", "supporting caselaw",
-                "counterarguments and rebuttal"
-        ]):
-            pdf.set_font("Arial", "B", 11)
-            label, sep, rest = text.partition(":")
-            pdf.multi_cell(0, 7, f"{label.strip()}:")
-            if rest.strip():
-                pdf.set_font("Arial", "", 11)
-                pdf.multi_cell(0, 7, rest.strip())
-        else:
-            pdf.set_font("Arial", "", 11)
-            pdf.set_text_color(0)
-            pdf.multi_cell(0, 7, text)
-
-    pdf.output(pdf_path)
-
-def content_hash(title, argument):
-    return hashlib.md5((title + argument).encode()).hexdigest()
-
-
 # ==== Streamlit UI ====
 st.title("ExonaScope Phase 3 – Case Analysis Memorandum")
 
@@ -463,6 +36,7 @@ case_number = st.text_input("Case Number",
                             value=st.session_state.get("case_number", ""),
                             key="case_number")
 today_date = date.today().strftime("%B %d, %Y")
+trace = session_trace(case_number)
 
 # --- Editable Facts ---
 memo_facts = st.text_area("Summary of Pertinent Facts",
@@ -532,174 +106,57 @@ if not allow_export:
 
 # --- Run Caselaw Search & Generate Memo ---
 if st.button("Run Caselaw Search & Generate Memo") and allow_export:
-    suppression_sections = []
-    defense_sections = []
-    # Dirty tracking for suppression
-    for idx, issue in enumerate(issue_args):
-        cur_hash = content_hash(issue["title"], issue["argument"])
-        hash_key, res_key = f"issue_hash_{idx}", f"issue_result_{idx}"
-        if st.session_state.get(
-                hash_key) != cur_hash or not st.session_state.get(res_key):
-            search_arg = f"{issue['title']} {issue['argument']}".strip()
-            cases = fetch_caselaw_from_courtlistener(
-                search_arg,
-                juris_codes,
-                limit=4,
-                appellate_only=appellate_only)
-            case_md_list = []
-            for c in cases:
-                bb = bluebook_citation(c)
-                if c.get('summary'):
-                    bb += f" — {c['summary']}"
-                case_md_list.append(bb)
-            memo_full = gpt_argument_and_rebuttal(issue['title'],
-                                                  issue['argument'],
-                                                  memo_facts, juris_label,
-                                                  "\n".join(case_md_list),
-                                                  True)
-            main, rebuttal = memo_full, ""
-            if memo_full and "Counterarguments and Rebuttal:" in memo_full:
-                parts = memo_full.split("Counterarguments and Rebuttal:")
-                main = parts[0].strip()
-                rebuttal = parts[1].strip() if len(parts) > 1 else ""
-            st.session_state[hash_key], st.session_state[res_key] = cur_hash, {
-                "title": issue["title"],
-                "argument": main,
-                "cases": cases,
-                "rebuttal": rebuttal
-            }
-        section = st.session_state[res_key]
-        suppression_sections.append(section)
+    # Unchanged sections come straight from the section cache, wherever they sit in the list
+    boxes = ([(idx, box, True) for idx, box in enumerate(issue_args)] +
+             [(idx, box, False) for idx, box in enumerate(defense_args)])
+    slots = [st.empty() for _ in boxes]
+    for slot, (_, box, _) in zip(slots, boxes):
+        slot.info(f"{box['title'] or 'Untitled'}: queued")
+
+    def show_draft(pos, text):
+        slots[pos].markdown(f"**Drafting: {boxes[pos][1]['title']}**\n\n{text} ▌")
 
-    # Dirty tracking for defenses
-    for idx, defense in enumerate(defense_args):
-        cur_hash = content_hash(defense["title"], defense["argument"])
-        hash_key, res_key = f"defense_hash_{idx}", f"defense_result_{idx}"
-        if st.session_state.get(
-                hash_key) != cur_hash or not st.session_state.get(res_key):
-            search_arg = f"{defense['title']} {defense['argument']}".strip()
-            cases = fetch_caselaw_from_courtlistener(
-                search_arg,
-                juris_codes,
-                limit=4,
-                appellate_only=appellate_only)
-            case_md_list = []
-            for c in cases:
-                bb = bluebook_citation(c)
-                if c.get('summary'):
-                    bb += f" — {c['summary']}"
-                case_md_list.append(bb)
-            memo_full = gpt_argument_and_rebuttal(defense['title'],
-                                                  defense['argument'],
-                                                  memo_facts, juris_label,
-                                                  "\n".join(case_md_list),
-                                                  False)
-            main, rebuttal = memo_full, ""
-            if memo_full and "Counterarguments and Rebuttal:" in memo_full:
-                parts = memo_full.split("Counterarguments and Rebuttal:")
-                main = parts[0].strip()
-                rebuttal = parts[1].strip() if len(parts) > 1 else ""
-            st.session_state[hash_key], st.session_state[res_key] = cur_hash, {
-                "title": defense["title"],
-                "argument": main,
-                "cases": cases,
-                "rebuttal": rebuttal
-            }
-        section = st.session_state[res_key]
-        defense_sections.append(section)
+    def show_section(pos, section):
+        slots[pos].markdown(section_html(boxes[pos][0] + 1, section), unsafe_allow_html=True)
+
+    with span("phase3.sections", issues=len(issue_args), defenses=len(defense_args)):
+        try:
+            sections = build_memo_sections([(box, is_suppression) for _, box, is_suppression in boxes], memo_facts,
+                                           juris_codes, juris_label, appellate_only,
+                                           on_text=show_draft, on_section=show_section)
+        except Exception as e:
+            st.error(f"Memo generation failed: {e}. Finished sections are cached; run again to retry the rest.")
+            st.stop()
+    for slot in slots:
+        slot.empty()
+    suppression_sections, defense_sections = sections[:len(issue_args)], sections[len(issue_args):]
 
     # --- Memo Preview ---
-    memo_lines = []
-    memo_lines.append(
-        "<div style='text-align: center; font-weight: bold; font-size:20px;'>CASE ANALYSIS MEMORANDUM</div>"
-    )
-    memo_lines.append(
-        f"<b>Defendant:</b> {Defendant_name} &nbsp;&nbsp;&nbsp; <b>Case Number:</b> {case_number} &nbsp;&nbsp;&nbsp; <b>Date:</b> {today_date}<br>"
-    )
-    memo_lines.append("<b>ATTORNEY–CLIENT PRIVILEGED / WORK PRODUCT</b><br>")
-    memo_lines.append(f"<b>SUMMARY OF PERTINENT FACTS</b><br>{memo_facts}<br>")
-    memo_lines.append("<b>A. SUPPRESSION ISSUES</b>")
-    for idx, s in enumerate(suppression_sections, 1):
-        memo_lines.append(
-            f"<b>{idx}. {s['title']}</b><br>{s['argument']}<br><b>Supporting Caselaw:</b>"
-        )
-        if s['cases']:
-            for c in s['cases']:
-                bb = bluebook_citation(c)
-                if c.get('summary'):
-                    bb += f" — {c['summary']}"
-                memo_lines.append(f"&nbsp;&nbsp;• {bb}")
-        else:
-            memo_lines.append(
-                "&nbsp;&nbsp;<i>No relevant caselaw found for this argument in the selected jurisdictions.</i>"
-            )
-        if s['rebuttal']:
-            memo_lines.append(
-                f"<b>Counterarguments and Rebuttal:</b> {s['rebuttal']}")
-        memo_lines.append("")
-    memo_lines.append("<b>B. POTENTIAL DEFENSES</b>")
-    for idx, d in enumerate(defense_sections, 1):
-        memo_lines.append(
-            f"<b>{idx}. {d['title']}</b><br>{d['argument']}<br><b>Supporting Caselaw:</b>"
-        )
-        if d['cases']:
-            for c in d['cases']:
-                bb = bluebook_citation(c)
-                if c.get('summary'):
-                    bb += f" — {c['summary']}"
-                memo_lines.append(f"&nbsp;&nbsp;• {bb}")
-        else:
-            memo_lines.append(
-                "&nbsp;&nbsp;<i>No relevant caselaw found for this argument in the selected jurisdictions.</i>"
-            )
-        if d['rebuttal']:
-            memo_lines.append(
-                f"<b>Counterarguments and Rebuttal:</b> {d['rebuttal']}")
-        memo_lines.append("")
-    memo_lines.extend([
-        "", "<b>CONCLUSION</b>",
-        "This memorandum is for internal defense team review only and is not intended for filing without attorney revision."
-    ])
-    st.markdown('<br>'.join(memo_lines), unsafe_allow_html=True)
+    memo = build_memo("CASE ANALYSIS MEMORANDUM", Defendant_name, case_number, today_date, memo_facts,
+                      suppression_sections, defense_sections)
+    st.markdown(memo_html(memo), unsafe_allow_html=True)
 
     # --- DOCX export ---
-    doc_obj = build_case_analysis_memo_docx("CASE ANALYSIS MEMORANDUM",
-                                            Defendant_name, case_number,
-                                            today_date, memo_facts,
-                                            suppression_sections,
-                                            defense_sections)
-    docx_bytes = BytesIO()
-    doc_obj.save(docx_bytes)
-    docx_bytes.seek(0)
+    with span("phase3.docx"):
+        docx_bytes = memo_docx_bytes(memo)
     st.download_button(
         "📥 Download Memo (.docx)",
-        data=docx_bytes.getvalue(),
+        data=docx_bytes,
         file_name="Case_Analysis_Memorandum.docx",
         mime=
         "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     )
 
-    # --- PDF Export (rich formatting, layout-matched to DOCX) ---
-    with open("temp_memo.docx", "wb") as temp_docx:
-        doc_obj.save(temp_docx.name)
-
-    pdf_path = "Case_Analysis_Memo.pdf"
-    convert_docx_to_pdf_rich(docx_path="temp_memo.docx",
-                             pdf_path=pdf_path,
-                             case_title="CASE ANALYSIS MEMORANDUM",
-                             case_number=case_number,
-                             memo_date=today_date)
-
-    with open(pdf_path, "rb") as f:
-        pdf_bytes = f.read()
-
+    # --- PDF Export (rendered from the same memo model, layout-matched to DOCX) ---
+    with span("phase3.pdf"):
+        pdf_bytes = memo_pdf_bytes(memo)
     st.download_button("📄 Download Memo as PDF",
                        data=pdf_bytes,
                        file_name="Case_Analysis_Memorandum.pdf",
                        mime="application/pdf")
 
-if st.checkbox("🪵 Show Session State"):
-    st.json(dict(st.session_state))
+if st.checkbox("⏱️ Show Timing Waterfall"):
+    show_timing_panel(trace)
 
 if st.button("🔄 Start New Analysis"):
     # Clear all relevant session state
@@ -0,0 +1,244 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Timing spans for every pipeline stage, collected per case (a Trace) and
+# aggregated process-wide into Prometheus-style metrics.
+
+MAX_TRACE_SPANS = int(os.getenv("TRACE_MAX_SPANS", "5000"))
+
+# Numeric span attributes that are also summed into *_total counters
+COUNTED_ATTRS = ("bytes", "pages", "chunks", "retries", "polls", "requests", "results", "prompt_tokens",
+                 "completion_tokens")
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_current_trace = contextvars.ContextVar("exonascope_trace", default=None)
+_current_span = contextvars.ContextVar("exonascope_span", default=None)
+
+
+class Span:
+
+    def __init__(self, name, trace_id=None, parent_id=None, attrs=None, start=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = dict(attrs or {})
+        self.start = time.time() if start is None else start
+        self.end = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+
+class Trace:
+    """The spans recorded for one case; oldest spans are dropped past `max_spans`."""
+
+    def __init__(self, name="", max_spans=MAX_TRACE_SPANS):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.max_spans = max_spans
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+            if len(self.spans) > self.max_spans:
+                del self.spans[:len(self.spans) - self.max_spans]
+
+    def snapshot(self):
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s.start)
+
+    def waterfall(self):
+        """Rows of (span, depth, offset seconds from the first span), parents before children."""
+        spans = self.snapshot()
+        if not spans:
+            return []
+        origin = spans[0].start
+        by_id = {s.span_id: s for s in spans}
+        children = {}
+        for s in spans:
+            parent = s.parent_id if s.parent_id in by_id else None
+            children.setdefault(parent, []).append(s)
+        rows = []
+
+        def walk(parent, depth):
+            for s in children.get(parent, []):
+                rows.append((s, depth, s.start - origin))
+                walk(s.span_id, depth + 1)
+
+        walk(None, 0)
+        return rows
+
+
+class Metrics:
+    """Process-wide per-stage histograms and counters fed by every finished span."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def observe(self, span):
+        with self._lock:
+            stage = self.stages.setdefault(span.name, {
+                "count": 0, "sum": 0.0, "errors": 0, "buckets": [0] * len(HISTOGRAM_BUCKETS), "totals": {}
+            })
+            stage["count"] += 1
+            stage["sum"] += span.duration
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if span.duration <= bound:
+                    stage["buckets"][i] += 1
+            if "error" in span.attrs:
+                stage["errors"] += 1
+            for key in COUNTED_ATTRS:
+                value = span.attrs.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage["totals"][key] = stage["totals"].get(key, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.stages))
+
+
+metrics = Metrics()
+
+
+def activate(trace):
+    """Make `trace` the destination for spans started in this context (e.g. a Streamlit script run)."""
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def bind(fn):
+    """Wrap `fn` to run in a copy of the caller's context, so spans from pool threads join the caller's trace."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def _finish(span):
+    if span.end is None:
+        span.end = time.time()
+    metrics.observe(span)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(span)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a child of the current span; yields the Span for attaching attributes."""
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    s = Span(name, trace.trace_id if trace else None, parent.span_id if parent else None, attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(s)
+
+
+def record_span(name, start, end=None, **attrs):
+    """Record an already-timed span (for generators, where a context manager can't straddle yields)."""
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    s = Span(name, trace.trace_id if trace else None, parent.span_id if parent else None, attrs, start=start)
+    s.end = end or time.time()
+    _finish(s)
+    return s
+
+
+# --- Export ---
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_text(snapshot=None):
+    """All stage metrics in the Prometheus text exposition format."""
+    stages = metrics.snapshot() if snapshot is None else snapshot
+    lines = [
+        "# HELP exonascope_stage_duration_seconds Time spent per pipeline stage.",
+        "# TYPE exonascope_stage_duration_seconds histogram",
+    ]
+    for name, stage in sorted(stages.items()):
+        label = f'stage="{_label(name)}"'
+        for bound, count in zip(HISTOGRAM_BUCKETS, stage["buckets"]):
+            lines.append(f'exonascope_stage_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'exonascope_stage_duration_seconds_bucket{{{label},le="+Inf"}} {stage["count"]}')
+        lines.append(f"exonascope_stage_duration_seconds_sum{{{label}}} {stage['sum']:.6f}")
+        lines.append(f"exonascope_stage_duration_seconds_count{{{label}}} {stage['count']}")
+    lines += ["# HELP exonascope_stage_errors_total Stage runs that raised.",
+              "# TYPE exonascope_stage_errors_total counter"]
+    for name, stage in sorted(stages.items()):
+        lines.append(f'exonascope_stage_errors_total{{stage="{_label(name)}"}} {stage["errors"]}')
+    for key in COUNTED_ATTRS:
+        rows = [(name, stage["totals"][key]) for name, stage in sorted(stages.items()) if key in stage["totals"]]
+        if not rows:
+            continue
+        lines += [f"# HELP exonascope_stage_{key}_total Sum of '{key}' recorded by each stage.",
+                  f"# TYPE exonascope_stage_{key}_total counter"]
+        lines += [f'exonascope_stage_{key}_total{{stage="{_label(name)}"}} {value}' for name, value in rows]
+    return "\n".join(lines) + "\n"
+
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otel_json(trace, service_name="exonascope"):
+    """A trace as OTLP/JSON-style resourceSpans, loadable by OpenTelemetry collectors and viewers."""
+    spans = []
+    for s in trace.snapshot():
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "parentSpanId": s.parent_id or "",
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(s.start * 1e9)),
+            "endTimeUnixNano": str(int((s.end or time.time()) * 1e9)),
+            "attributes": [{"key": k, "value": _otel_value(v)} for k, v in s.attrs.items()] +
+            [{"key": "thread.name", "value": {"stringValue": s.thread}}],
+            "status": {"code": 2, "message": s.attrs["error"]} if "error" in s.attrs else {"code": 1},
+        })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": service_name}},
+                {"key": "case", "value": {"stringValue": trace.name}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "exonascope.telemetry"}, "spans": spans}],
+        }]
+    }
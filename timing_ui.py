@@ -0,0 +1,71 @@
+import html
+import json
+
+import streamlit as st
+
+from backends import loaded_backends
+from case_memo import section_cache_stats
+from courtlistener_client import search_cache_stats
+from http_client import breaker_states
+from llm_client import llm_cache_stats
+from telemetry import Trace, activate, otel_json, prometheus_text
+
+# Per-case timing waterfall shared by all three phases
+
+WATERFALL_MAX_ROWS = 300
+SHOWN_ATTRS = ("file", "kind", "bytes", "pages", "ocr_pages", "chunks", "polls", "retries", "planned_requests",
+               "requests", "results", "prompt_tokens", "completion_tokens", "cache_hit", "status", "title", "error")
+
+
+def session_trace(case_label=""):
+    """The session's trace for the current case, activated for this script run.
+
+    A new trace starts when the case changes.
+    """
+    trace = st.session_state.get("timing_trace")
+    if trace is None or (case_label and trace.name != case_label):
+        trace = Trace(case_label)
+        st.session_state["timing_trace"] = trace
+    return activate(trace)
+
+
+def _attr_summary(attrs):
+    return ", ".join(f"{k}={attrs[k]}" for k in SHOWN_ATTRS if k in attrs)
+
+
+def render_waterfall(trace):
+    rows = trace.waterfall()[-WATERFALL_MAX_ROWS:]
+    if not rows:
+        st.info("No timings recorded yet for this case.")
+        return
+    origin = min(offset for _, _, offset in rows)
+    total = max(offset - origin + s.duration for s, _, offset in rows) or 1.0
+    lines = []
+    for s, depth, offset in rows:
+        left = (offset - origin) / total * 100
+        width = max(s.duration / total * 100, 0.3)
+        color = "#c0392b" if "error" in s.attrs else "#2265bc"
+        lines.append(
+            '<div style="display:flex;align-items:center;font:12px monospace;margin:1px 0">'
+            f'<div style="width:32%;padding-left:{depth * 12}px;white-space:nowrap;overflow:hidden;'
+            f'text-overflow:ellipsis" title="{html.escape(_attr_summary(s.attrs))}">{html.escape(s.name)}</div>'
+            '<div style="position:relative;flex:1;height:12px;background:#f2f2f2">'
+            f'<div style="position:absolute;left:{left:.2f}%;width:{width:.2f}%;height:100%;background:{color}">'
+            '</div></div>'
+            f'<div style="width:9%;text-align:right">{s.duration:.2f}s</div></div>')
+    st.markdown("".join(lines), unsafe_allow_html=True)
+    st.caption(f"{len(rows)} spans over {total:.1f}s. Hover a stage name for bytes, pages, tokens and retries.")
+
+
+def show_timing_panel(trace):
+    """Waterfall for the current case, plus metric exports, cache stats, circuit breakers and loaded backends."""
+    render_waterfall(trace)
+    col1, col2 = st.columns(2)
+    col1.download_button("Export trace (OpenTelemetry JSON)", json.dumps(otel_json(trace), indent=2),
+                         file_name=f"exonascope_trace_{trace.trace_id[:8]}.json", mime="application/json",
+                         key="export_otel_trace")
+    col2.download_button("Export metrics (Prometheus)", prometheus_text(), file_name="exonascope_metrics.prom",
+                         mime="text/plain", key="export_prometheus_metrics")
+    st.json({"llm_cache": llm_cache_stats(), "courtlistener_cache": search_cache_stats(),
+             "memo_section_cache": section_cache_stats(), "upstreams": breaker_states(),
+             "backend_import_seconds": loaded_backends()})
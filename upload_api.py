@@ -1,17 +1,413 @@
 # upload_api.py
 
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, UploadFile, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+import asyncio
+import hashlib
+import json
 import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+
+from assemblyai_client import cancel_job
+from extraction import extract_text
+from telemetry import Trace, activate, otel_json, prometheus_text
 
 app = FastAPI()
 
 UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# In-progress resumable uploads: <upload_id>.part data plus <upload_id>.json metadata
+PARTIAL_DIR = os.path.join(UPLOAD_DIR, ".partial")
+# Finished uploads: <sha256> -> name of the stored file in UPLOAD_DIR
+HASH_INDEX_DIR = os.path.join(UPLOAD_DIR, ".by_hash")
+os.makedirs(PARTIAL_DIR, exist_ok=True)
+os.makedirs(HASH_INDEX_DIR, exist_ok=True)
+
+# Disk writes are batched to this size and done off the event loop
+WRITE_BUFFER_SIZE = 1024 * 1024
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Shared secret AssemblyAI echoes back in the webhook auth header
+WEBHOOK_SECRET = os.getenv("ASSEMBLYAI_WEBHOOK_SECRET")
+# Webhook notifications are kept this long for late waiters, then pruned
+WEBHOOK_RETENTION_SECONDS = 3600
+MAX_WAIT_SECONDS = 60
+
+# transcript_id -> {"status": str, "event": asyncio.Event, "updated": float}
+transcript_events = {}
+
+
+def _transcript_entry(transcript_id):
+    if transcript_id not in transcript_events:
+        transcript_events[transcript_id] = {"status": "pending", "event": asyncio.Event(), "updated": time.time()}
+    return transcript_events[transcript_id]
+
+
+def _prune_transcript_events():
+    cutoff = time.time() - WEBHOOK_RETENTION_SECONDS
+    for transcript_id in [k for k, v in transcript_events.items() if v["updated"] < cutoff]:
+        del transcript_events[transcript_id]
+
 
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as f:
-        while chunk := await file.read(1024 * 1024):
-            f.write(chunk)
-    return {"filename": file.filename}
+    filename = os.path.basename(file.filename)
+    file_path = os.path.join(UPLOAD_DIR, filename)
+    temp_path = os.path.join(PARTIAL_DIR, f"{uuid.uuid4().hex}.tmp")
+    f = await asyncio.to_thread(open, temp_path, "wb")
+    try:
+        while chunk := await file.read(WRITE_BUFFER_SIZE):
+            await asyncio.to_thread(f.write, chunk)
+    finally:
+        await asyncio.to_thread(f.close)
+    await asyncio.to_thread(os.replace, temp_path, file_path)
+    return {"filename": filename}
+
+
+# --- Resumable uploads ---
+#
+# POST /uploads                  create a session -> {"upload_id", "offset"}
+# GET|HEAD /uploads/{upload_id}  current offset (also as an Upload-Offset header)
+# PATCH /uploads/{upload_id}     append the raw request body at the Upload-Offset header
+#
+# Data is hashed as it arrives. Once the declared size is reached the file is stored
+# under its SHA-256 with an atomic rename, or dropped in favour of an identical file
+# that is already stored.
+
+class UploadCreate(BaseModel):
+    filename: str
+    size: int
+    sha256: str | None = None
+
+
+# upload_id -> {"filename", "size", "sha256", "offset", "hasher", "lock"}
+upload_sessions = {}
+# upload_id -> response of the finished upload
+completed_uploads = {}
+
+
+def _partial_path(upload_id):
+    return os.path.join(PARTIAL_DIR, f"{upload_id}.part")
+
+
+def _meta_path(upload_id):
+    return os.path.join(PARTIAL_DIR, f"{upload_id}.json")
+
+
+def _valid_sha256(digest):
+    """The lowercased digest; 422 unless it is exactly 64 hex characters."""
+    digest = digest.lower()
+    if not SHA256_PATTERN.match(digest):
+        raise HTTPException(status_code=422, detail="sha256 must be 64 hex characters")
+    return digest
+
+
+def _stored_path_for_hash(digest):
+    """Path of the stored upload with exactly this SHA-256, or None."""
+    if not SHA256_PATTERN.match(digest):
+        return None
+    try:
+        with open(os.path.join(HASH_INDEX_DIR, digest)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        # Stored before the index existed: <digest><ext>, matched on the exact stem
+        name = next((n for n in os.listdir(UPLOAD_DIR) if os.path.splitext(n)[0] == digest), None)
+        if name is None:
+            return None
+        _index_stored_file(digest, name)
+    path = os.path.join(UPLOAD_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _index_stored_file(digest, name):
+    temp_path = os.path.join(HASH_INDEX_DIR, f"{digest}.{uuid.uuid4().hex}.tmp")
+    with open(temp_path, "w") as f:
+        f.write(name)
+    os.replace(temp_path, os.path.join(HASH_INDEX_DIR, digest))
+
+
+def _hash_partial(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(WRITE_BUFFER_SIZE):
+            hasher.update(chunk)
+    return hasher
+
+
+def _load_session(upload_id):
+    """Rebuild a session from disk, e.g. after a server restart; the partial file is the source of truth."""
+    with open(_meta_path(upload_id)) as f:
+        meta = json.load(f)
+    path = _partial_path(upload_id)
+    return {**meta, "offset": os.path.getsize(path), "hasher": _hash_partial(path), "lock": asyncio.Lock()}
+
+
+async def _get_session(upload_id):
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise HTTPException(status_code=404, detail="Unknown upload")
+    if upload_id not in upload_sessions:
+        if not os.path.exists(_meta_path(upload_id)):
+            raise HTTPException(status_code=404, detail="Unknown upload")
+        upload_sessions[upload_id] = await asyncio.to_thread(_load_session, upload_id)
+    return upload_sessions[upload_id]
+
+
+def _append(f, hasher, data):
+    f.write(data)
+    hasher.update(data)
+
+
+def _finalize_upload(upload_id, session):
+    digest = session["hasher"].hexdigest()
+    partial = _partial_path(upload_id)
+    if session["sha256"] and session["sha256"].lower() != digest:
+        os.remove(partial)
+        os.remove(_meta_path(upload_id))
+        return None
+    existing = _stored_path_for_hash(digest)
+    if existing:
+        os.remove(partial)
+        path = existing
+    else:
+        path = os.path.join(UPLOAD_DIR, digest + os.path.splitext(session["filename"])[1].lower())
+        os.replace(partial, path)
+        _index_stored_file(digest, os.path.basename(path))
+    os.remove(_meta_path(upload_id))
+    return {"upload_id": upload_id, "filename": session["filename"], "offset": session["size"], "complete": True,
+            "sha256": digest, "path": path, "deduplicated": bool(existing)}
+
+
+def _create_session_files(upload_id, meta):
+    open(_partial_path(upload_id), "wb").close()
+    with open(_meta_path(upload_id), "w") as f:
+        json.dump(meta, f)
+
+
+@app.post("/uploads")
+async def create_upload(body: UploadCreate):
+    if body.size < 0:
+        raise HTTPException(status_code=400, detail="Invalid size")
+    filename = os.path.basename(body.filename)
+    sha256 = _valid_sha256(body.sha256) if body.sha256 else None
+    if sha256:
+        existing = await asyncio.to_thread(_stored_path_for_hash, sha256)
+        if existing:
+            return {"upload_id": None, "filename": filename, "offset": body.size, "complete": True,
+                    "sha256": sha256, "path": existing, "deduplicated": True}
+    upload_id = uuid.uuid4().hex
+    meta = {"filename": filename, "size": body.size, "sha256": sha256}
+    await asyncio.to_thread(_create_session_files, upload_id, meta)
+    upload_sessions[upload_id] = {**meta, "offset": 0, "hasher": hashlib.sha256(), "lock": asyncio.Lock()}
+    if body.size == 0:
+        return await _complete(upload_id, upload_sessions[upload_id])
+    return {"upload_id": upload_id, "filename": filename, "offset": 0, "complete": False}
+
+
+async def _complete(upload_id, session):
+    result = await asyncio.to_thread(_finalize_upload, upload_id, session)
+    upload_sessions.pop(upload_id, None)
+    if result is None:
+        raise HTTPException(status_code=422, detail="SHA-256 mismatch; upload discarded")
+    completed_uploads[upload_id] = result
+    return result
+
+
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str, response: Response):
+    if upload_id in completed_uploads:
+        result = completed_uploads[upload_id]
+    else:
+        session = await _get_session(upload_id)
+        result = {"upload_id": upload_id, "filename": session["filename"], "offset": session["offset"],
+                  "complete": False}
+    response.headers["Upload-Offset"] = str(result["offset"])
+    return result
+
+
+@app.head("/uploads/{upload_id}")
+async def upload_offset(upload_id: str):
+    if upload_id in completed_uploads:
+        offset = completed_uploads[upload_id]["offset"]
+    else:
+        offset = (await _get_session(upload_id))["offset"]
+    return Response(headers={"Upload-Offset": str(offset)})
+
+
+@app.patch("/uploads/{upload_id}")
+async def append_upload(upload_id: str, request: Request, upload_offset: int = Header(...)):
+    if upload_id in completed_uploads:
+        return completed_uploads[upload_id]
+    session = await _get_session(upload_id)
+    async with session["lock"]:
+        if upload_offset != session["offset"]:
+            raise HTTPException(status_code=409, detail={"offset": session["offset"]},
+                                headers={"Upload-Offset": str(session["offset"])})
+        f = await asyncio.to_thread(open, _partial_path(upload_id), "ab")
+        try:
+            buffer = bytearray()
+            async for chunk in request.stream():
+                if session["offset"] + len(buffer) + len(chunk) > session["size"]:
+                    raise HTTPException(status_code=413, detail="Chunk exceeds declared upload size")
+                buffer += chunk
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    await asyncio.to_thread(_append, f, session["hasher"], bytes(buffer))
+                    session["offset"] += len(buffer)
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(_append, f, session["hasher"], bytes(buffer))
+                session["offset"] += len(buffer)
+        finally:
+            await asyncio.to_thread(f.close)
+        if session["offset"] == session["size"]:
+            return await _complete(upload_id, session)
+    return {"upload_id": upload_id, "offset": session["offset"], "complete": False}
+
+
+@app.post("/assemblyai/webhook")
+async def assemblyai_webhook(payload: dict, x_webhook_secret: str | None = Header(default=None)):
+    if WEBHOOK_SECRET and x_webhook_secret != WEBHOOK_SECRET:
+        raise HTTPException(status_code=401, detail="Invalid webhook secret")
+    transcript_id = payload.get("transcript_id")
+    if not transcript_id:
+        raise HTTPException(status_code=400, detail="Missing transcript_id")
+    _prune_transcript_events()
+    entry = _transcript_entry(transcript_id)
+    entry["status"] = payload.get("status", "completed")
+    entry["updated"] = time.time()
+    entry["event"].set()
+    return {"ok": True}
+
+
+@app.get("/assemblyai/transcripts/{transcript_id}/wait")
+async def wait_for_transcript(transcript_id: str, timeout: float = 10):
+    """Long-poll until the webhook for this transcript arrives or the timeout passes."""
+    entry = _transcript_entry(transcript_id)
+    try:
+        await asyncio.wait_for(entry["event"].wait(), timeout=min(timeout, MAX_WAIT_SECONDS))
+    except asyncio.TimeoutError:
+        pass
+    return {"transcript_id": transcript_id, "status": entry["status"]}
+
+
+# --- Background extraction jobs ---
+#
+# POST /jobs          queue extract_text on a finished upload -> {"job_id"}
+# GET /jobs/{job_id}  status, latest progress message and (when done) the result
+# DELETE /jobs/{job_id}  cancel a queued or running job
+#
+# Jobs run on their own worker pool, so ingest capacity scales with JOB_WORKERS
+# independently of the Streamlit UI processes.
+
+ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RETENTION_SECONDS = 24 * 3600
+
+job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="extract-job")
+# job_id -> {"status", "progress", "result", "error", "filename", ...}; guarded by jobs_lock
+jobs = {}
+jobs_lock = threading.Lock()
+
+
+class JobCreate(BaseModel):
+    sha256: str
+    filename: str
+    mime_type: str | None = None
+    pdf_mode: Literal["hybrid", "text", "ocr"] = "hybrid"
+
+
+def _update_job(job_id, **fields):
+    with jobs_lock:
+        jobs[job_id].update(fields, updated=time.time())
+
+
+def _job_view(job):
+    return {k: job[k] for k in ("job_id", "filename", "status", "progress", "result", "error", "created", "updated")}
+
+
+def _prune_jobs():
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with jobs_lock:
+        for job_id in [k for k, v in jobs.items() if v["updated"] < cutoff and v["status"] not in ("queued", "running")]:
+            del jobs[job_id]
+
+
+def _run_job(job_id):
+    with jobs_lock:
+        job = jobs[job_id]
+        if job["status"] == "cancelled":
+            return
+        job.update(status="running", updated=time.time())
+        job["trace"] = activate(Trace(job_id))
+    try:
+        with open(job["path"], "rb") as f:
+            result = extract_text(f, job["filename"], job["mime_type"], ASSEMBLYAI_API_KEY, pdf_mode=job["pdf_mode"],
+                                  job_key=job_id, progress=lambda message: _update_job(job_id, progress=message))
+        with jobs_lock:
+            if job["status"] != "cancelled":
+                job.update(status="completed", result=result, updated=time.time())
+    except Exception as e:
+        with jobs_lock:
+            if job["status"] != "cancelled":
+                job.update(status="failed", error=str(e), updated=time.time())
+
+
+@app.post("/jobs")
+async def create_job(body: JobCreate):
+    path = await asyncio.to_thread(_stored_path_for_hash, _valid_sha256(body.sha256))
+    if not path:
+        raise HTTPException(status_code=404, detail="No completed upload with that SHA-256")
+    _prune_jobs()
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with jobs_lock:
+        jobs[job_id] = {"job_id": job_id, "path": path, "filename": os.path.basename(body.filename),
+                        "mime_type": body.mime_type, "pdf_mode": body.pdf_mode, "status": "queued",
+                        "progress": "Queued", "result": None, "error": None, "created": now, "updated": now}
+        jobs[job_id]["future"] = job_pool.submit(_run_job, job_id)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    with jobs_lock:
+        if job_id not in jobs:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return _job_view(jobs[job_id])
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_extraction_job(job_id: str):
+    with jobs_lock:
+        if job_id not in jobs:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        job = jobs[job_id]
+        if job["status"] in ("queued", "running"):
+            job.update(status="cancelled", updated=time.time())
+            job["future"].cancel()
+    # Stops any transcription wait and drops the transcript at AssemblyAI
+    await asyncio.to_thread(cancel_job, job_id, ASSEMBLYAI_API_KEY)
+    return _job_view(job)
+
+
+@app.get("/jobs/{job_id}/trace")
+async def get_job_trace(job_id: str):
+    """The job's timing spans as OpenTelemetry-style JSON."""
+    with jobs_lock:
+        if job_id not in jobs:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        trace = jobs[job_id].get("trace")
+    if trace is None:
+        raise HTTPException(status_code=409, detail="Job has not started")
+    return otel_json(trace, service_name="exonascope-jobs")
+
+
+@app.get("/metrics")
+async def metrics():
+    """Per-stage timing histograms and counters in Prometheus text format."""
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")